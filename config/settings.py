@@ -45,6 +45,7 @@ LOGOUT_REDIRECT_URL = "login"
 
 
 MIDDLEWARE = [
+    "mailing.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -132,6 +133,52 @@ EMAIL_HOST_USER = os.getenv("EMAIL")
 EMAIL_HOST_PASSWORD = os.getenv("PASS")
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Время жизни закэшированных страниц списков (кэш сбрасывается при изменении данных)
+MAILING_LIST_CACHE_TIMEOUT = 60 * 15
+# Сколько писем отправлять через одно SMTP-соединение до переподключения
+MAILING_MESSAGES_PER_CONNECTION = 100
+# Размер пачки при записи попыток рассылки; при сбое теряется не более одной пачки
+MAILING_ATTEMPT_BATCH_SIZE = 500
+# Сколько получателей читать из БД за раз при отправке рассылки
+MAILING_RECIPIENT_CHUNK_SIZE = 2000
+# Количество потоков отправки (у каждого своё SMTP-соединение)
+MAILING_CONCURRENCY = 4
+# Количество одновременных SMTP-сессий в асинхронном режиме (start_mailing --async)
+MAILING_ASYNC_CONCURRENCY = 100
+# Через сколько секунд задание очереди, взятое упавшим воркером, отдаётся снова.
+# Работающий воркер продлевает блокировку и не держит пачку дольше половины этого времени
+MAILING_OUTBOX_LOCK_TIMEOUT = 600
+# Повторы неудачных отправок: сколько раз и базовая пауза в секундах,
+# которая удваивается с каждой попыткой (но не больше MAILING_RETRY_BACKOFF_MAX)
+MAILING_MAX_RETRIES = 5
+MAILING_RETRY_BACKOFF = 60
+MAILING_RETRY_BACKOFF_MAX = 6 * 60 * 60
+# Ограничения скорости отправки (писем в секунду, допустимый всплеск) для всех
+# писем, для писем одного владельца и для одного домена получателя, например
+# {"global": (10, 20), "owner": (5, 10), "domain": (3, 5)}. По умолчанию
+# ограничений нет; отсутствующая область или None её не ограничивает.
+# Состояние лимитов хранится в Redis (MAILING_RATE_LIMIT_REDIS_URL ниже) и общее
+# для всех воркеров; без Redis лимиты действуют в каждом процессе отдельно.
+MAILING_RATE_LIMITS = {}
+# Сколько строк CSV записывать одним bulk_create при импорте получателей
+MAILING_IMPORT_BATCH_SIZE = 1000
+# Сколько попыток читать из БД за раз при потоковой выгрузке
+MAILING_EXPORT_CHUNK_SIZE = 2000
+# Модераторские списки: начиная с этого числа строк показывается примерное
+# количество (оценка PostgreSQL или COUNT, закэшированный на указанное время)
+MAILING_APPROXIMATE_COUNT_THRESHOLD = 10000
+MAILING_COUNT_CACHE_TIMEOUT = 5 * 60
+# Хранение попыток: archive_attempts переносит попытки старше указанного
+# числа дней в сжатые помесячные файлы в MAILING_ARCHIVE_DIR и удаляет их
+MAILING_ATTEMPT_RETENTION_DAYS = 180
+MAILING_ARCHIVE_DIR = BASE_DIR / "archive"
+MAILING_ARCHIVE_BATCH_SIZE = 5000
+# Метрики запросов по представлениям (время, SQL-запросы, кэш) на /metrics/
+# в формате Prometheus; доступны суперпользователю или с заголовком
+# Authorization: Bearer <MAILING_METRICS_TOKEN>
+MAILING_METRICS_ENABLED = os.getenv("METRICS_ENABLED") == "1"
+MAILING_METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -148,3 +195,6 @@ CACHES = {
         "LOCATION": "redis://localhost:6379/1",
     }
 }
+
+# Redis для корзин MAILING_RATE_LIMITS (None — корзины в памяти процесса)
+MAILING_RATE_LIMIT_REDIS_URL = CACHES["default"]["LOCATION"]
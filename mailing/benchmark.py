@@ -0,0 +1,430 @@
+import platform
+import resource
+import time
+import tracemalloc
+import uuid
+from contextlib import nullcontext
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import invalidate_user_cache
+from .counters import adjust_counters
+from .letters import PLACEHOLDER_RE, LetterTemplate, get_values
+from .metrics import QueryCounter
+from .models import (
+    DashboardCounters,
+    Mailing,
+    MailingAttempt,
+    MailingStatsHourly,
+    Message,
+    OutboxJob,
+    Recipient,
+)
+from .ratelimit import RateLimiter, get_rate_limiter
+from .retention import delete_rows
+from .services import (
+    enqueue_mailing,
+    get_pool,
+    get_undelivered_recipients,
+    process_outbox,
+    start_mailing,
+)
+from .smtp_standin import SMTPStandIn
+
+User = get_user_model()
+
+
+# Замер скорости отправки для bench_mailing: синтетические пользователи с
+# получателями и рассылками, отправка через обычный код рассылки на
+# локальный SMTP-сервер (SMTPStandIn) или в память (MemoryBackend) и
+# результат в виде словаря для JSON. Данные замера удаляются после прогона.
+BENCH_DOMAIN = "bench.invalid"
+SEED_BATCH_SIZE = 1000
+
+STATIC_LETTER = ("Тестовое письмо рассылки с кириллицей и обычной длиной строк.\n") * 8
+PERSONALIZED_LETTER = "Здравствуйте, {{ full_name }}!\n" + STATIC_LETTER
+LONG_TITLE = "Новости сервиса рассылок: обновления, советы и ответы на вопросы"
+PERSONALIZED_TITLE = "{{ full_name }}, новости сервиса рассылок"
+
+
+class MemoryBackend(BaseEmailBackend):
+    """Почтовый бэкенд для замеров: кодирует письма, как SMTP-бэкенд, но не отправляет.
+
+    latency — пауза в секундах после каждого письма.
+    """
+
+    def __init__(self, latency=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            message.message().as_bytes(linesep="\r\n")
+            if self.latency:
+                time.sleep(self.latency)
+        return len(email_messages)
+
+
+def get_peak_rss():
+    """Пиковый RSS процесса в МиБ (ru_maxrss в Linux — в КиБ)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile_ms(values, fraction):
+    """Процентиль отсортированного списка секунд в миллисекундах (ближайший ранг)."""
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 3)
+
+
+def get_environment():
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+    }
+
+
+def measure_memory(function):
+    """Вызывает function и возвращает пик памяти Python (tracemalloc) в МиБ и время в с."""
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        function()
+        duration = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 2**20, 2), round(duration, 3)
+
+
+def seed(users=1, recipients=1000, mailings=1, personalized=False):
+    """Создаёт пользователей замера с получателями и рассылками.
+
+    Каждая рассылка пользователя идёт всем его получателям. Возвращает
+    (список пользователей, список рассылок).
+    """
+    tag = uuid.uuid4().hex[:8]
+    owners = []
+    for number in range(users):
+        owner = User(
+            email=f"bench-{tag}-{number}@{BENCH_DOMAIN}",
+            username=f"bench-{tag}-{number}",
+        )
+        owner.set_unusable_password()
+        owners.append(owner)
+    owners = User.objects.bulk_create(owners)
+
+    created = []
+    now = timezone.now()
+    for owner in owners:
+        for start in range(0, recipients, SEED_BATCH_SIZE):
+            batch = []
+            for number in range(start, min(start + SEED_BATCH_SIZE, recipients)):
+                email = f"r{number}-{owner.id}@{BENCH_DOMAIN}"
+                batch.append(
+                    Recipient(
+                        email=email,
+                        email_normalized=email,
+                        full_name=f"Получатель {number}",
+                        owner=owner,
+                    )
+                )
+            Recipient.objects.bulk_create(batch)
+        adjust_counters(owner.id, recipients=recipients)
+
+        for number in range(mailings):
+            message = Message.objects.create(
+                title=f"Замер {tag} №{number}",
+                letter=PERSONALIZED_LETTER if personalized else STATIC_LETTER,
+                owner=owner,
+            )
+            mailing = Mailing.objects.create(
+                first_datetime=now,
+                end_datetime=now + timedelta(days=1),
+                message=message,
+                owner=owner,
+            )
+            recipient_ids = (
+                Recipient.objects.filter(owner=owner)
+                .values_list("id", flat=True)
+                .iterator(chunk_size=SEED_BATCH_SIZE)
+            )
+            Through = Mailing.recipients.through
+            batch = []
+            for recipient_id in recipient_ids:
+                batch.append(Through(mailing_id=mailing.id, recipient_id=recipient_id))
+                if len(batch) >= SEED_BATCH_SIZE:
+                    Through.objects.bulk_create(batch)
+                    batch = []
+            Through.objects.bulk_create(batch)
+            created.append(mailing)
+    return owners, created
+
+
+def cleanup(owners):
+    """Удаляет пользователей замера со всеми их данными.
+
+    Строки удаляются напрямую (delete_rows), без загрузки объектов и
+    сигналов, иначе удаление десятков тысяч получателей заняло бы больше
+    самого замера.
+    """
+    ids = [owner.id for owner in owners]
+    mailing_ids = list(
+        Mailing.objects.filter(owner_id__in=ids).values_list("id", flat=True)
+    )
+    with transaction.atomic():
+        delete_rows(MailingAttempt, ids, "owner")
+        delete_rows(OutboxJob, mailing_ids, "mailing")
+        delete_rows(MailingStatsHourly, ids, "owner")
+        delete_rows(Mailing.recipients.through, mailing_ids, "mailing")
+        delete_rows(Mailing, mailing_ids)
+        delete_rows(Message, ids, "owner")
+        delete_rows(Recipient, ids, "owner")
+        delete_rows(DashboardCounters, ids, "user")
+        User.objects.filter(id__in=ids).delete()
+    invalidate_user_cache(*ids)
+
+
+def deliver(mailings, mode, pool, batch_size=None):
+    """Отправляет рассылки через start_mailing или очередь; возвращает (успешно, ошибки)."""
+    success = failed = 0
+    for mailing in mailings:
+        if mode == "outbox":
+            enqueue_mailing(mailing.id)
+            while True:
+                result = process_outbox(batch_size, mailing_id=mailing.id, pool=pool)
+                if not result["total"]:
+                    break
+                success += result["success"]
+                failed += result["failed"]
+        else:
+            result = start_mailing(mailing.id, pool=pool)
+            if result["status"] == "error":
+                raise RuntimeError(result["message"])
+            success += result["success"]
+            failed += result["failed"]
+    return success, failed
+
+
+def get_connection_options(backend, port=None, latency=0.0):
+    """Параметры почтового соединения пула отправки (см. DeliveryPool)."""
+    if backend == "memory":
+        return {"backend": "mailing.benchmark.MemoryBackend", "latency": latency}
+    return {
+        "backend": "django.core.mail.backends.smtp.EmailBackend",
+        "host": "127.0.0.1",
+        "port": port,
+        "username": "",
+        "password": "",
+        "use_tls": False,
+        "use_ssl": False,
+    }
+
+
+def run_benchmark(
+    users=1,
+    recipients=1000,
+    mailings=1,
+    mode="direct",
+    backend="smtp",
+    latency=0.0,
+    concurrency=None,
+    use_async=False,
+    messages_per_connection=None,
+    personalized=False,
+    rate_limits=False,
+    keep=False,
+):
+    """Засевает данные, отправляет рассылки и возвращает результаты замера."""
+    if use_async and backend != "smtp":
+        raise ValueError("Асинхронная отправка работает только через SMTP")
+
+    owners, created = seed(users, recipients, mailings, personalized)
+    timings = []
+    limiter = get_rate_limiter() if rate_limits else RateLimiter({})
+    queries = QueryCounter()
+    seeded_rss = get_peak_rss()
+
+    server = SMTPStandIn(latency) if backend == "smtp" else nullcontext()
+    try:
+        with server:
+            pool = get_pool(
+                concurrency,
+                use_async,
+                limiter=limiter,
+                timings=timings,
+                max_messages=messages_per_connection,
+                connection_options=get_connection_options(
+                    backend, getattr(server, "port", None), latency
+                ),
+            )
+            with connection.execute_wrapper(queries):
+                started = time.perf_counter()
+                success, failed = deliver(created, mode, pool)
+                duration = time.perf_counter() - started
+    finally:
+        if not keep:
+            cleanup(owners)
+
+    sent = success + failed
+    timings.sort()
+    return {
+        "timestamp": timezone.now().isoformat(),
+        "config": {
+            "users": users,
+            "recipients_per_user": recipients,
+            "mailings_per_user": mailings,
+            "mode": mode,
+            "backend": backend,
+            "latency_ms": latency * 1000,
+            "concurrency": pool.concurrency,
+            "async": use_async,
+            "messages_per_connection": messages_per_connection
+            or getattr(settings, "MAILING_MESSAGES_PER_CONNECTION", 100),
+            "personalized": personalized,
+            "rate_limits": rate_limits,
+        },
+        "environment": get_environment(),
+        "messages": sent,
+        "success": success,
+        "failed": failed,
+        "duration_s": round(duration, 3),
+        "messages_per_second": round(sent / duration, 1) if duration else None,
+        "latency_ms": {
+            "p50": percentile_ms(timings, 0.5),
+            "p99": percentile_ms(timings, 0.99),
+            "max": percentile_ms(timings, 1),
+        },
+        "queries": queries.count,
+        "queries_per_recipient": round(queries.count / sent, 3) if sent else None,
+        "sql_time_s": round(queries.duration, 3),
+        # ru_maxrss не сбрасывается: рост пика за время отправки — разница
+        "peak_rss_after_seed_mib": round(seeded_rss, 1),
+        "peak_rss_mib": round(get_peak_rss(), 1),
+    }
+
+
+def run_memory_benchmark(recipients=100000, keep=False):
+    """Сравнивает память на обход получателей рассылки.
+
+    "queryset" — прежний обход mailing.recipients.all(), который держит все
+    объекты в кэше queryset; "stream" — обход, как в start_mailing: только
+    нужные колонки, порциями по MAILING_RECIPIENT_CHUNK_SIZE. Пик памяти
+    потокового обхода не должен расти с числом получателей.
+    """
+    owners, created = seed(1, recipients, 1)
+    mailing = created[0]
+    chunk_size = getattr(settings, "MAILING_RECIPIENT_CHUNK_SIZE", 2000)
+
+    def load_queryset():
+        recipients = mailing.recipients.all()
+        for recipient in recipients:
+            recipient.email
+
+    def stream():
+        recipients = (
+            get_undelivered_recipients(mailing)
+            .only("id", "email", "full_name")
+            .order_by()
+            .iterator(chunk_size=chunk_size)
+        )
+        for recipient in recipients:
+            recipient.email
+
+    try:
+        results = {}
+        for name, function in (("queryset", load_queryset), ("stream", stream)):
+            peak, duration = measure_memory(function)
+            results[name] = {"peak_mib": peak, "duration_s": duration}
+    finally:
+        if not keep:
+            cleanup(owners)
+
+    return {
+        "timestamp": timezone.now().isoformat(),
+        "scenario": "memory",
+        "config": {"recipients": recipients, "chunk_size": chunk_size},
+        "environment": get_environment(),
+        **results,
+    }
+
+
+def time_letters(prepare, recipients):
+    """Время подготовки и кодирования писем, в мкс на письмо.
+
+    prepare() возвращает функцию, которая строит письмо получателю; её
+    вызов тоже входит в замер.
+    """
+    started = time.perf_counter()
+    build = prepare()
+    for recipient in recipients:
+        build(recipient).message().as_bytes(linesep="\r\n")
+    return round((time.perf_counter() - started) / len(recipients) * 1e6, 2)
+
+
+def compare_letters(subject, body, recipients):
+    from_email = settings.DEFAULT_FROM_EMAIL
+
+    def email_message():
+        def build(recipient):
+            # Подстановки по регулярному выражению для каждого письма
+            values = get_values(recipient)
+
+            def substitute(text):
+                return PLACEHOLDER_RE.sub(lambda match: values[match.group(1)], text)
+
+            return EmailMessage(
+                subject=substitute(subject),
+                body=substitute(body),
+                from_email=from_email,
+                to=[recipient.email],
+            )
+
+        return build
+
+    def template():
+        return LetterTemplate(subject, body, from_email).for_recipient
+
+    email_message_us = time_letters(email_message, recipients)
+    template_us = time_letters(template, recipients)
+    return {
+        "email_message_us": email_message_us,
+        "template_us": template_us,
+        "speedup": round(email_message_us / template_us, 2),
+    }
+
+
+def run_letters_benchmark(messages=10000):
+    """Сравнивает подготовку письма одному получателю.
+
+    "email_message_us" — отдельный EmailMessage на каждого получателя, как
+    до LetterTemplate; "template_us" — LetterTemplate.for_recipient, включая
+    однократную сборку шаблона. "personalized" — письмо с {{ full_name }} в
+    теме и тексте, "overhead_us" — его дополнительная стоимость для шаблона
+    по сравнению со статическим. Получатели создаются только в памяти.
+    """
+    recipients = [
+        Recipient(email=f"r{number}@{BENCH_DOMAIN}", full_name=f"Получатель {number}")
+        for number in range(messages)
+    ]
+    static = compare_letters(LONG_TITLE, STATIC_LETTER, recipients)
+    personalized = compare_letters(PERSONALIZED_TITLE, PERSONALIZED_LETTER, recipients)
+    personalized["overhead_us"] = round(
+        personalized["template_us"] - static["template_us"], 2
+    )
+    return {
+        "timestamp": timezone.now().isoformat(),
+        "scenario": "letters",
+        "config": {"messages": messages, "subject": LONG_TITLE},
+        "environment": get_environment(),
+        "static": static,
+        "personalized": personalized,
+    }
@@ -0,0 +1,93 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .metrics import record_cache_lookup
+
+
+# Закэшированные страницы пользователя привязаны к номеру версии его данных.
+# Любое изменение получателей, сообщений, рассылок или попыток увеличивает
+# версию, после чего старые записи просто перестают находиться и истекают сами.
+
+
+def version_key(user_id):
+    return f"views:version:{user_id}"
+
+
+def get_user_cache_version(user_id):
+    # Служебное чтение, в метрики кэша (record_cache_lookup) не попадает:
+    # иначе каждый запрос к странице давал бы лишнее попадание
+    version = cache.get(version_key(user_id))
+    if version is None:
+        # Начальное значение от времени: если ключ версии вытеснен из кэша,
+        # новая версия не совпадёт со старыми страницами
+        version = time.time_ns()
+        cache.add(version_key(user_id), version, None)
+        version = cache.get(version_key(user_id), version)
+    return version
+
+
+def invalidate_user_cache(*user_ids):
+    for user_id in set(user_ids):
+        if user_id is None:
+            continue
+        try:
+            cache.incr(version_key(user_id))
+        except ValueError:
+            cache.set(version_key(user_id), time.time_ns(), None)
+
+
+def cache_per_user(timeout=None):
+    """Кэширует GET-ответы представления отдельно для каждого пользователя.
+
+    Ключ строится из ID пользователя, версии его данных, полного пути запроса
+    (страница, фильтры) и CSRF-cookie браузера, так как шаблоны могут
+    содержать CSRF-токен. Запросы с непрочитанными flash-сообщениями не
+    кэшируются.
+    """
+    if timeout is None:
+        timeout = getattr(settings, "MAILING_LIST_CACHE_TIMEOUT", 60 * 15)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method != "GET"
+                or not request.user.is_authenticated
+                or len(get_messages(request))
+            ):
+                return view_func(request, *args, **kwargs)
+
+            raw_key = "|".join(
+                [
+                    request.get_full_path(),
+                    request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+                ]
+            )
+            key = "views:page:{}:{}:{}".format(
+                request.user.id,
+                get_user_cache_version(request.user.id),
+                hashlib.md5(raw_key.encode()).hexdigest(),
+            )
+
+            cached = cache.get(key)
+            record_cache_lookup(cached is not None)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                if hasattr(response, "render"):
+                    response.render()
+                cache.set(key, (response.content, response["Content-Type"]), timeout)
+            return response
+
+        return wrapper
+
+    return decorator
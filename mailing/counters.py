@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import DashboardCounters, Mailing, Recipient
+
+
+# Счётчики главной страницы поддерживаются инкрементально (сигналы и код
+# рассылки), а rebuild_counters пересчитывает их с нуля, если они разошлись.
+COUNTER_FIELDS = ["total_mailings", "active_mailings", "recipients"]
+
+
+def get_count_querysets(user_ids=None):
+    """Запросы пересчёта: (рассылки, получатели) по владельцам."""
+    mailings = Mailing.objects.values("owner_id").annotate(
+        total=Count("id"), active=Count("id", filter=Q(status="started"))
+    )
+    recipients = Recipient.objects.values("owner_id").annotate(total=Count("id"))
+    if user_ids is not None:
+        mailings = mailings.filter(owner_id__in=user_ids)
+        recipients = recipients.filter(owner_id__in=user_ids)
+    return mailings.order_by(), recipients.order_by()
+
+
+def count_for_users(user_ids=None):
+    """Считает счётчики по таблицам для указанных (или всех) пользователей."""
+    mailings, recipients = get_count_querysets(user_ids)
+    counters = {
+        user_id: DashboardCounters(user_id=user_id) for user_id in user_ids or []
+    }
+    for row in mailings:
+        if row["owner_id"] is None:
+            continue
+        item = counters.setdefault(
+            row["owner_id"], DashboardCounters(user_id=row["owner_id"])
+        )
+        item.total_mailings = row["total"]
+        item.active_mailings = row["active"]
+    for row in recipients:
+        if row["owner_id"] is None:
+            continue
+        item = counters.setdefault(
+            row["owner_id"], DashboardCounters(user_id=row["owner_id"])
+        )
+        item.recipients = row["total"]
+    return list(counters.values())
+
+
+def rebuild_counters(user_ids=None, batch_size=1000):
+    counters = count_for_users(user_ids)
+    with transaction.atomic():
+        if user_ids is None:
+            DashboardCounters.objects.all().delete()
+        DashboardCounters.objects.bulk_create(
+            counters,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=COUNTER_FIELDS,
+        )
+    return len(counters)
+
+
+def adjust_counters(user_id, rebuild_missing=True, **deltas):
+    """Атомарно изменяет счётчики пользователя на указанные величины.
+
+    Если строки счётчиков ещё нет, она пересчитывается по таблицам; при
+    rebuild_missing=False (удаление) изменение просто пропускается — строку
+    создаст get_counters при следующем обращении.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if user_id is None or not deltas:
+        return
+    updated = DashboardCounters.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated and rebuild_missing:
+        # Строки ещё нет — считаем по таблицам, изменение уже в них учтено
+        rebuild_counters([user_id])
+
+
+def get_counters(user):
+    try:
+        return DashboardCounters.objects.get(user_id=user.id)
+    except DashboardCounters.DoesNotExist:
+        rebuild_counters([user.id])
+        return DashboardCounters.objects.get(user_id=user.id)
@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+# Выгрузка попыток идёт потоком: строки читаются из БД порциями
+# (на PostgreSQL — серверным курсором) только с нужными колонками и сразу
+# отдаются клиенту, поэтому размер выгрузки не ограничен памятью процесса.
+EXPORT_COLUMNS = [
+    ("id", "id"),
+    ("attempt_datetime", "attempt_datetime"),
+    ("status", "status"),
+    ("mailing_id", "mailing_id"),
+    ("recipient_email", "recipient__email"),
+    ("recipient_full_name", "recipient__full_name"),
+    ("owner_email", "owner__email"),
+    ("response_code", "response_code"),
+    ("server_response", "response__text"),
+]
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Сколько строк собирать в один кусок ответа
+ROWS_PER_WRITE = 500
+
+
+def parse_day(value, name):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError(f"Некорректная дата {name}: ожидается ГГГГ-ММ-ДД")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_attempts(queryset, params):
+    """Применяет фильтры выгрузки из GET-параметров.
+
+    mailing_id, status, date_from и date_to (включительно, ГГГГ-ММ-ДД).
+    """
+    mailing_id = params.get("mailing_id")
+    if mailing_id:
+        if not mailing_id.isdigit():
+            raise ValidationError("Некорректный mailing_id")
+        queryset = queryset.filter(mailing_id=mailing_id)
+    status = params.get("status")
+    if status:
+        queryset = queryset.filter(status=status)
+    if params.get("date_from"):
+        queryset = queryset.filter(
+            attempt_datetime__gte=parse_day(params["date_from"], "date_from")
+        )
+    if params.get("date_to"):
+        queryset = queryset.filter(
+            attempt_datetime__lt=parse_day(params["date_to"], "date_to")
+            + timedelta(days=1)
+        )
+    return queryset
+
+
+def iter_attempt_rows(queryset, chunk_size=None):
+    chunk_size = chunk_size or getattr(settings, "MAILING_EXPORT_CHUNK_SIZE", 2000)
+    return (
+        queryset.order_by("-attempt_datetime", "-id")
+        .values_list(*[lookup for _, lookup in EXPORT_COLUMNS])
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % ROWS_PER_WRITE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    lines = []
+    for row in rows:
+        lines.append(
+            json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder, ensure_ascii=False)
+        )
+        if len(lines) >= ROWS_PER_WRITE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export_attempts(queryset, export_format):
+    """Возвращает генератор кусков текста выгрузки в формате csv или ndjson."""
+    rows = iter_attempt_rows(queryset)
+    if export_format == "ndjson":
+        return stream_ndjson(rows)
+    return stream_csv(rows)
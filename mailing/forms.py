@@ -0,0 +1,13 @@
+from django import forms
+
+
+class RecipientImportForm(forms.Form):
+    file = forms.FileField(
+        label="CSV-файл",
+        help_text="Колонки: email, full_name и необязательная comment",
+    )
+    update_existing = forms.BooleanField(
+        label="Обновлять существующих получателей",
+        help_text="Иначе адреса, которые уже есть в списке, пропускаются",
+        required=False,
+    )
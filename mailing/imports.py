@@ -0,0 +1,170 @@
+import csv
+import io
+
+from django.conf import settings
+from django.contrib.auth.base_user import BaseUserManager
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .caching import invalidate_user_cache
+from .counters import adjust_counters
+from .models import Recipient, normalize_email
+
+
+# Импорт читает CSV построчно и пишет получателей пачками, поэтому память не
+# зависит от размера файла: в ней только текущая пачка и несколько примеров
+# ошибок. Дубликаты ищутся по адресам пачки (без учёта регистра), а не по
+# всем получателям владельца.
+MAX_REPORTED_ERRORS = 100
+
+EMAIL_MAX_LENGTH = Recipient._meta.get_field("email").max_length
+FULL_NAME_MAX_LENGTH = Recipient._meta.get_field("full_name").max_length
+COMMENT_MAX_LENGTH = Recipient._meta.get_field("comment").max_length
+
+
+def open_csv(file, encoding="utf-8-sig"):
+    """Оборачивает бинарный файл (в том числе загруженный) в построчный CSV-ридер."""
+    text = io.TextIOWrapper(file, encoding=encoding, newline="")
+    return csv.DictReader(text)
+
+
+def clean_row(row):
+    """Возвращает поля получателя из строки CSV или бросает ValidationError."""
+    email = BaseUserManager.normalize_email((row.get("email") or "").strip())
+    full_name = (row.get("full_name") or "").strip()
+    comment = (row.get("comment") or "").strip() or None
+
+    if not email:
+        raise ValidationError("Не указан email")
+    if len(email) > EMAIL_MAX_LENGTH:
+        raise ValidationError("Слишком длинный email")
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValidationError("Некорректный email")
+    if not full_name:
+        raise ValidationError("Не указаны Ф.И.О.")
+    if len(full_name) > FULL_NAME_MAX_LENGTH:
+        raise ValidationError("Слишком длинные Ф.И.О.")
+    if comment and len(comment) > COMMENT_MAX_LENGTH:
+        raise ValidationError("Слишком длинный комментарий")
+    return {"email": email, "full_name": full_name, "comment": comment}
+
+
+def upsert_recipients(owner, rows, update_existing=True):
+    """Добавляет получателей владельца одним запросом.
+
+    rows — словари с полями email, full_name и comment. Адреса, которые у
+    владельца уже есть (без учёта регистра), обновляются, а при
+    update_existing=False пропускаются; ошибки уникальности не возникает.
+    Возвращает пару (добавлено, уже было).
+    """
+    recipients = {}
+    for fields in rows:
+        recipient = Recipient(owner=owner, **fields)
+        recipient.email_normalized = normalize_email(recipient.email)
+        recipients[recipient.email_normalized] = recipient
+    if not recipients:
+        return 0, 0
+
+    with transaction.atomic():
+        existing = Recipient.objects.filter(
+            owner=owner, email_normalized__in=list(recipients)
+        ).count()
+        if update_existing:
+            Recipient.objects.bulk_create(
+                recipients.values(),
+                update_conflicts=True,
+                unique_fields=["owner", "email_normalized"],
+                update_fields=["email", "full_name", "comment"],
+            )
+        else:
+            Recipient.objects.bulk_create(recipients.values(), ignore_conflicts=True)
+        # bulk_create не шлёт post_save — счётчики и кэш обновляем сами
+        created = len(recipients) - existing
+        adjust_counters(owner.id, recipients=created)
+    invalidate_user_cache(owner.id)
+    return created, existing
+
+
+class RecipientImport:
+    """Построчный импорт получателей владельца из CSV.
+
+    Ожидаются колонки email, full_name и (необязательно) comment. Повторы
+    адреса внутри файла пропускаются, а адреса, которые уже есть у владельца,
+    пропускаются или, при update_existing, обновляются.
+    """
+
+    def __init__(self, owner, batch_size=None, update_existing=False):
+        self.owner = owner
+        self.batch_size = batch_size or getattr(
+            settings, "MAILING_IMPORT_BATCH_SIZE", 1000
+        )
+        self.update_existing = update_existing
+        self.batch = {}
+        self.accepted = 0
+        self.updated = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, reason):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": reason})
+
+    def add(self, line, row):
+        try:
+            fields = clean_row(row)
+        except ValidationError as error:
+            self.reject(line, "; ".join(error.messages))
+            return
+        key = normalize_email(fields["email"])
+        if key in self.batch:
+            self.duplicates += 1
+            return
+        self.batch[key] = fields
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        created, existing = upsert_recipients(
+            self.owner, self.batch.values(), self.update_existing
+        )
+        self.accepted += created
+        if self.update_existing:
+            self.updated += existing
+        else:
+            self.duplicates += existing
+        self.batch = {}
+
+    def run(self, reader):
+        try:
+            if not reader.fieldnames or "email" not in reader.fieldnames:
+                raise ValidationError("В файле нет колонки email")
+            for row in reader:
+                self.add(reader.line_num, row)
+            self.flush()
+        except (UnicodeDecodeError, csv.Error) as error:
+            if reader.line_num <= 1:
+                raise ValidationError(f"Файл не удалось прочитать: {error}")
+            self.flush()
+            self.reject(reader.line_num, f"Файл не удалось прочитать: {error}")
+        return self.report()
+
+    def report(self):
+        return {
+            "accepted": self.accepted,
+            "updated": self.updated,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+def import_recipients(owner, file, batch_size=None, update_existing=False):
+    """Импортирует получателей из бинарного CSV-файла и возвращает отчёт."""
+    return RecipientImport(owner, batch_size, update_existing).run(open_csv(file))
@@ -0,0 +1,203 @@
+import base64
+import copy
+import re
+from email.utils import formatdate, make_msgid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import BadHeaderError, EmailMessage
+from django.core.mail.message import (
+    RFC5322_EMAIL_LINE_LENGTH_LIMIT,
+    forbid_multi_line_headers,
+)
+from django.core.mail.utils import DNS_NAME
+
+
+# Письмо рассылки собирается и кодируется один раз на версию сообщения.
+# Для каждого получателя к готовым байтам дописываются только его заголовки
+# To, Date и Message-ID, а если в теме или тексте есть подстановки
+# ({{ full_name }}, {{ email }}) — ещё тема и тело, в которые значения
+# подставляются через str.format_map без повторного разбора текста.
+# Объект письма повторяет ту часть интерфейса EmailMessage, которой
+# пользуются почтовые бэкенды Django и AsyncSMTPSession.
+PER_RECIPIENT_HEADERS = ("To", "Date", "Message-ID")
+
+PLACEHOLDERS = {
+    "full_name": "Ф.И.О. получателя",
+    "email": "email получателя",
+}
+PLACEHOLDER_RE = re.compile(r"{{\s*(\w+)\s*}}")
+NEWLINE_RE = re.compile(r"\r\n|\r|\n")
+
+
+def find_unknown_placeholders(text):
+    return sorted(
+        {
+            name
+            for name in PLACEHOLDER_RE.findall(text or "")
+            if name not in PLACEHOLDERS
+        }
+    )
+
+
+@lru_cache(maxsize=256)
+def compile_text(text):
+    """Переводит текст с подстановками в строку формата для str.format_map.
+
+    Возвращает (строка формата, есть ли в тексте подстановки); неизвестные
+    подстановки остаются частью текста.
+    """
+    parts = []
+    position = 0
+    for match in PLACEHOLDER_RE.finditer(text):
+        if match.group(1) in PLACEHOLDERS:
+            parts += [text[position : match.start()], match.group(1)]
+            position = match.end()
+    parts.append(text[position:])
+    template = "".join(
+        "{%s}" % part if i % 2 else part.replace("{", "{{").replace("}", "}}")
+        for i, part in enumerate(parts)
+    )
+    return template, len(parts) > 1
+
+
+def get_values(recipient):
+    """Значения подстановок; переводы строк приводятся к CRLF, как в теле письма."""
+    values = {"full_name": recipient.full_name or "", "email": recipient.email}
+    for name, value in values.items():
+        if not value.isprintable():
+            values[name] = NEWLINE_RE.sub("\r\n", value)
+    return values
+
+
+def encode_header(name, value, encoding):
+    """Значение заголовка в кодировке RFC 2047, как у forbid_multi_line_headers.
+
+    email.header.Header подбирает длину каждого фрагмента посимвольно, что
+    дорого для каждого получателя; здесь значение режется по 11 символов —
+    не больше 44 байт, то есть не длиннее 75 символов в закодированном виде.
+    """
+    if "\n" in value or "\r" in value:
+        raise BadHeaderError(
+            f"Header values can't contain newlines (got {value!r} for header {name!r})"
+        )
+    if value.isascii():
+        return value
+    chunks = (value[i : i + 11] for i in range(0, len(value), 11))
+    return "\r\n ".join(
+        f"=?{encoding}?b?{base64.b64encode(chunk.encode(encoding)).decode()}?="
+        for chunk in chunks
+    )
+
+
+@lru_cache(maxsize=128)
+def get_letter_template(subject, body, from_email=None):
+    """LetterTemplate для версии сообщения; повторные прогоны берут его из кэша."""
+    return LetterTemplate(subject, body, from_email)
+
+
+class LetterTemplate:
+    """Письмо, закодированное один раз для всех получателей."""
+
+    def __init__(self, subject, body, from_email=None):
+        self.subject, personal_subject = compile_text(subject)
+        self.body, personal_body = compile_text(NEWLINE_RE.sub("\r\n", body))
+        self.personalized = personal_subject or personal_body
+        self.subject_header = None
+        message = EmailMessage(
+            subject=subject,
+            body=body,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            to=["recipient@example.invalid"],
+        )
+        self.from_email = message.from_email
+        self.encoding = message.encoding or settings.DEFAULT_CHARSET
+        mime = message.message()
+        for name in PER_RECIPIENT_HEADERS:
+            del mime[name]
+        if self.personalized:
+            # Тема, кодировка тела и само тело у каждого получателя свои:
+            # в data остаются общие заголовки и пустая строка после них
+            del mime["Subject"]
+            del mime["Content-Transfer-Encoding"]
+            mime.set_payload("")
+            if not personal_subject:
+                self.subject_header = encode_header("Subject", subject, self.encoding)
+        self.data = mime.as_bytes(linesep="\r\n")
+
+    @classmethod
+    def for_mailing(cls, mailing):
+        return get_letter_template(
+            mailing.message.title, mailing.message.letter, settings.DEFAULT_FROM_EMAIL
+        )
+
+    def for_recipient(self, recipient):
+        if not self.personalized:
+            return PreparedLetter(self, recipient.email)
+
+        values = get_values(recipient)
+        body = self.body.format_map(values).encode(self.encoding)
+        if len(body) > RFC5322_EMAIL_LINE_LENGTH_LIMIT and any(
+            len(line) > RFC5322_EMAIL_LINE_LENGTH_LIMIT for line in body.splitlines()
+        ):
+            # Длинные строки нужно кодировать quoted-printable — в этом
+            # редком случае письмо целиком собирает EmailMessage
+            return EmailMessage(
+                subject=self.subject.format_map(values),
+                body=body.decode(self.encoding),
+                from_email=self.from_email,
+                to=[recipient.email],
+            )
+
+        subject = self.subject_header or encode_header(
+            "Subject", self.subject.format_map(values), self.encoding
+        )
+        headers = (
+            f"Subject: {subject}\r\n"
+            f"Content-Transfer-Encoding: {'7bit' if body.isascii() else '8bit'}\r\n"
+        )
+        return PreparedLetter(self, recipient.email, headers.encode("ascii"), body)
+
+
+class PreparedLetter:
+    """Письмо одному получателю на основе LetterTemplate.
+
+    message() возвращает сам объект: бэкендам нужен только as_bytes().
+    """
+
+    def __init__(self, template, email, headers=b"", body=b""):
+        self.template = template
+        self.from_email = template.from_email
+        self.encoding = template.encoding
+        self.to = [email]
+        # Проверка на переводы строк, как в EmailMessage.message()
+        _, self.to_header = forbid_multi_line_headers("To", email, self.encoding)
+        self.headers = headers
+        self.body = body
+
+    def recipients(self):
+        return self.to
+
+    def message(self):
+        return self
+
+    def get_charset(self):
+        return None
+
+    def as_bytes(self, unixfrom=False, linesep="\n"):
+        headers = (
+            f"To: {self.to_header}\r\n"
+            f"Date: {formatdate(localtime=settings.EMAIL_USE_LOCALTIME)}\r\n"
+            f"Message-ID: {make_msgid(domain=DNS_NAME)}\r\n"
+        )
+        data = headers.encode("ascii") + self.headers + self.template.data + self.body
+        if linesep != "\r\n":
+            data = data.replace(b"\r\n", linesep.encode())
+        return data
+
+    def __deepcopy__(self, memo):
+        # locmem-бэкенд копирует письма в outbox; закодированный шаблон
+        # неизменяем и может быть общим
+        letter = copy.copy(self)
+        letter.to = list(self.to)
+        return letter
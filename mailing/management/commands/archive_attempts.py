@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from mailing.models import MailingAttempt
+from mailing.retention import archive_attempts, get_retention_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит старые попытки рассылок в сжатые помесячные архивы '
+        'и удаляет их из БД (статистика рассылок сохраняется)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Архивировать попытки старше указанного числа дней '
+            '(по умолчанию MAILING_ATTEMPT_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=None,
+            help='Каталог для архивов (по умолчанию MAILING_ARCHIVE_DIR)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Сколько попыток удалять за одну транзакцию '
+            '(по умолчанию MAILING_ARCHIVE_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--no-archive',
+            action='store_true',
+            help='Удалить попытки, не записывая архив',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько попыток будет архивировано',
+        )
+
+    def handle(self, *args, **options):
+        before = get_retention_cutoff(options['days'])
+
+        if options['dry_run']:
+            count = MailingAttempt.objects.filter(attempt_datetime__lt=before).count()
+            self.stdout.write(f'Попыток старше {before:%Y-%m-%d %H:%M}: {count}')
+            return
+
+        counts = archive_attempts(
+            before,
+            directory=options['archive_dir'],
+            batch_size=options['batch_size'],
+            archive=not options['no_archive'],
+        )
+        for month, count in sorted(counts.items()):
+            self.stdout.write(f'{month}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Архивировано попыток старше {before:%Y-%m-%d %H:%M}: {sum(counts.values())}'
+        ))
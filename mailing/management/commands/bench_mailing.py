@@ -0,0 +1,138 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from mailing.benchmark import run_benchmark, run_letters_benchmark, run_memory_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет скорость отправки рассылок на синтетических данных '
+        '(создаёт и после замера удаляет своих пользователей, получателей и рассылки) '
+        'и выводит результат в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            choices=['delivery', 'memory', 'letters'],
+            default='delivery',
+            help='delivery — отправка рассылок, memory — память на обход получателей '
+            '(все объекты в queryset против потокового чтения; только --recipients и --keep), '
+            'letters — подготовка письма: EmailMessage против LetterTemplate '
+            '(только --recipients, без записи в БД)',
+        )
+        parser.add_argument(
+            '--users', type=int, default=1, help='Сколько пользователей создать'
+        )
+        parser.add_argument(
+            '--recipients',
+            type=int,
+            default=1000,
+            help='Сколько получателей у каждого пользователя',
+        )
+        parser.add_argument(
+            '--mailings',
+            type=int,
+            default=1,
+            help='Сколько рассылок у каждого пользователя (каждая — всем его получателям)',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=['direct', 'outbox'],
+            default='direct',
+            help='direct — start_mailing, outbox — очередь OutboxJob и process_outbox',
+        )
+        parser.add_argument(
+            '--backend',
+            choices=['smtp', 'memory'],
+            default='smtp',
+            help='smtp — локальный SMTP-сервер в отдельном процессе, '
+            'memory — письма только кодируются',
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0,
+            help='Имитируемая задержка сервера на письмо, мс',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Количество потоков или асинхронных сессий отправки',
+        )
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='use_async',
+            help='Асинхронная отправка через asyncio (только --backend smtp)',
+        )
+        parser.add_argument(
+            '--messages-per-connection',
+            type=int,
+            default=None,
+            help='Сколько писем отправлять через одно SMTP-соединение '
+            '(по умолчанию MAILING_MESSAGES_PER_CONNECTION; 1 — новое соединение на каждое письмо)',
+        )
+        parser.add_argument(
+            '--personalized',
+            action='store_true',
+            help='Письма с подстановкой {{ full_name }}',
+        )
+        parser.add_argument(
+            '--rate-limits',
+            action='store_true',
+            help='Применять MAILING_RATE_LIMITS (по умолчанию замер без ограничений)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Дописать результат строкой JSON в этот файл (для истории замеров)',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Не удалять созданные для замера данные',
+        )
+
+    def handle(self, *args, **options):
+        if options['use_async'] and options['backend'] != 'smtp':
+            raise CommandError('Асинхронная отправка работает только с --backend smtp')
+        if options['messages_per_connection'] is not None and options['messages_per_connection'] < 1:
+            raise CommandError('--messages-per-connection должно быть больше нуля')
+        if options['users'] < 1 or options['recipients'] < 1 or options['mailings'] < 1:
+            raise CommandError('--users, --recipients и --mailings должны быть больше нуля')
+
+        try:
+            if options['scenario'] == 'memory':
+                self.stderr.write(f'Замер памяти на {options["recipients"]} получателей...')
+                result = run_memory_benchmark(options['recipients'], keep=options['keep'])
+            elif options['scenario'] == 'letters':
+                self.stderr.write(f'Замер подготовки {options["recipients"]} писем...')
+                result = run_letters_benchmark(options['recipients'])
+            else:
+                result = self.run_delivery(options)
+        except RuntimeError as error:
+            raise CommandError(str(error))
+
+        if options['output']:
+            with open(options['output'], 'a', encoding='utf-8') as file:
+                file.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
+
+    def run_delivery(self, options):
+        total = options['users'] * options['recipients'] * options['mailings']
+        self.stderr.write(f'Замер отправки {total} писем...')
+        return run_benchmark(
+            users=options['users'],
+            recipients=options['recipients'],
+            mailings=options['mailings'],
+            mode=options['mode'],
+            backend=options['backend'],
+            latency=options['latency'] / 1000,
+            concurrency=options['concurrency'],
+            use_async=options['use_async'],
+            messages_per_connection=options['messages_per_connection'],
+            personalized=options['personalized'],
+            rate_limits=options['rate_limits'],
+            keep=options['keep'],
+        )
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from mailing.query_plans import find_seq_scans, get_querysets
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет через EXPLAIN, что запросы списков и пересчёта счётчиков '
+        'используют индексы (только PostgreSQL, на заполненной базе)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-id',
+            type=int,
+            help='Пользователь, от имени которого строятся запросы '
+            '(по умолчанию — владелец наибольшего числа получателей)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов запросов поддерживается только для PostgreSQL')
+
+        user = self.get_user(options.get('user_id'))
+        failures = []
+        for name, queryset in get_querysets(user):
+            plan = queryset.explain()
+            seq_scans = find_seq_scans(plan)
+            if seq_scans:
+                failures.append(name)
+                self.stdout.write(
+                    self.style.ERROR(f'{name}: Seq Scan по {", ".join(seq_scans)}')
+                )
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+
+        if failures:
+            raise CommandError(f'Полный просмотр таблиц в запросах: {", ".join(failures)}')
+
+    def get_user(self, user_id):
+        if user_id:
+            return User.objects.get(id=user_id)
+        user = (
+            User.objects.annotate(recipient_count=Count('recipients'))
+            .order_by('-recipient_count')
+            .first()
+        )
+        if user is None:
+            raise CommandError('В базе нет пользователей')
+        return user
@@ -0,0 +1,57 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from mailing.imports import import_recipients
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = 'Импортирует получателей пользователя из CSV (колонки email, full_name, comment)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к CSV-файлу')
+        parser.add_argument(
+            '--owner',
+            required=True,
+            help='Email владельца, которому добавляются получатели',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Сколько строк записывать за раз (по умолчанию MAILING_IMPORT_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Обновлять Ф.И.О. и комментарий получателей, которые уже есть',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(email=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {options["owner"]} не найден')
+
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_recipients(
+                    owner, file, options['batch_size'], options['update']
+                )
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть файл: {error}')
+        except ValidationError as error:
+            raise CommandError('; '.join(error.messages))
+        elapsed = time.monotonic() - started
+
+        for error in report['errors']:
+            self.stderr.write(f'Строка {error["line"]}: {error["error"]}')
+        rows = sum(report[key] for key in ('accepted', 'updated', 'duplicates', 'rejected'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {report["accepted"]}, обновлено: {report["updated"]}, '
+            f'дубликатов: {report["duplicates"]}, '
+            f'отклонено: {report["rejected"]} '
+            f'({rows} строк за {elapsed:.1f} с, {rows / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
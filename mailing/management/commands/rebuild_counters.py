@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from mailing.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики главной страницы по данным рассылок и получателей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-id',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Пересчитать только для указанного пользователя (можно несколько раз)',
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_counters(options.get('user_ids'))
+        self.stdout.write(self.style.SUCCESS(f'Счётчики пересчитаны для {count} пользователей'))
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from mailing.services import process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь отправки писем (можно запускать несколько воркеров)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mailing-id',
+            type=int,
+            help='Обрабатывать только задания указанной рассылки',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Сколько заданий забирать за раз (по умолчанию MAILING_ATTEMPT_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Количество потоков отправки (по умолчанию MAILING_CONCURRENCY)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Завершиться, когда очередь опустеет',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Воркер рассылок запущен')
+        try:
+            while True:
+                result = process_outbox(
+                    batch_size=options.get('batch_size'),
+                    concurrency=options.get('concurrency'),
+                    mailing_id=options.get('mailing_id'),
+                )
+                if result['total']:
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f'Обработано заданий: {result["total"]}, '
+                            f'Успешно: {result["success"]}, '
+                            f'Ошибки: {result["failed"]}'
+                        )
+                    )
+                    continue
+                if options.get('once'):
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Воркер рассылок остановлен')
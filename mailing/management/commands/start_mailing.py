@@ -1,7 +1,15 @@
 from django.core.management.base import BaseCommand
+from django.utils import timezone
 from mailing.models import Mailing
-from mailing.views import start_mailing
+from mailing.services import (
+    enqueue_mailing,
+    get_due_mailings,
+    get_next_schedule_time,
+    start_mailing,
+    stop_expired_mailings,
+)
 import logging
+import time
 
 
 logger = logging.getLogger(__name__)
@@ -21,25 +29,65 @@ class Command(BaseCommand):
             action='store_true',
             help='Запустить все активные рассылки',
         )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Количество потоков отправки (по умолчанию MAILING_CONCURRENCY)',
+        )
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='use_async',
+            help='Асинхронная отправка через asyncio (для очень больших рассылок)',
+        )
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help='Поставить письма в очередь для run_mailing_worker вместо отправки',
+        )
+        parser.add_argument(
+            '--scheduler',
+            action='store_true',
+            help='Работать как планировщик: запускать и останавливать рассылки по расписанию',
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=float,
+            default=60,
+            help='Максимальная пауза планировщика в секундах (чтобы заметить новые рассылки)',
+        )
 
     def handle(self, *args, **options):
         mailing_id = options.get('mailing_id')
         all_active = options.get('all_active')
+        self.concurrency = options.get('concurrency')
+        self.use_async = options.get('use_async')
+        self.enqueue = options.get('enqueue')
 
         if mailing_id:
             self.start_single_mailing(mailing_id)
         elif all_active:
             self.start_all_active_mailings()
+        elif options.get('scheduler'):
+            self.run_scheduler(options['max_sleep'])
         else:
             self.stdout.write(
-                self.style.ERROR('Необходимо указать --mailing-id или --all-active')
+                self.style.ERROR(
+                    'Необходимо указать --mailing-id, --all-active или --scheduler'
+                )
             )
 
     def start_single_mailing(self, mailing_id):
         try:
             mailing = Mailing.objects.get(id=mailing_id)
+            if self.enqueue:
+                self.enqueue_mailing(mailing_id)
+                return
             self.stdout.write(f'Запуск рассылки ID {mailing_id}...')
-            result = start_mailing(mailing_id)
+            result = start_mailing(
+                mailing_id, concurrency=self.concurrency, use_async=self.use_async
+            )
             self.print_result(result, mailing_id)
         except Mailing.DoesNotExist:
             self.stdout.write(
@@ -55,10 +103,50 @@ class Command(BaseCommand):
         self.stdout.write(f'Найдено {active_mailings.count()} активных рассылок...')
 
         for mailing in active_mailings:
+            if self.enqueue:
+                self.enqueue_mailing(mailing.id)
+                continue
             self.stdout.write(f'Запуск рассылки ID {mailing.id}...')
-            result = start_mailing(mailing.id)
+            result = start_mailing(
+                mailing.id, concurrency=self.concurrency, use_async=self.use_async
+            )
             self.print_result(result, mailing.id)
 
+    def run_scheduler(self, max_sleep):
+        self.stdout.write('Планировщик рассылок запущен')
+        try:
+            while True:
+                for mailing_id in stop_expired_mailings():
+                    self.stdout.write(f'Рассылка ID {mailing_id} остановлена по времени')
+
+                for mailing in get_due_mailings():
+                    if self.enqueue:
+                        self.enqueue_mailing(mailing.id)
+                        continue
+                    self.stdout.write(f'Запуск рассылки ID {mailing.id} по расписанию...')
+                    result = start_mailing(
+                        mailing.id, concurrency=self.concurrency, use_async=self.use_async
+                    )
+                    self.print_result(result, mailing.id)
+
+                # Спим до ближайшего события, но не дольше max_sleep
+                delay = max_sleep
+                next_time = get_next_schedule_time()
+                if next_time:
+                    delay = min(delay, (next_time - timezone.now()).total_seconds())
+                time.sleep(max(delay, 0))
+        except KeyboardInterrupt:
+            self.stdout.write('Планировщик рассылок остановлен')
+
+    def enqueue_mailing(self, mailing_id):
+        pending = enqueue_mailing(mailing_id)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Рассылка ID {mailing_id} поставлена в очередь. '
+                f'Ожидают отправки: {pending}'
+            )
+        )
+
     def print_result(self, result, mailing_id):
         if result.get('status') == 'error':
             self.stdout.write(
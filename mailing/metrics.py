@@ -0,0 +1,189 @@
+import bisect
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+
+# Метрики запросов по представлениям: время ответа, число и время SQL-запросов
+# и обращения к кэшу приложения. Значения копятся в памяти процесса (у каждого
+# воркера gunicorn — свои, как и у RateLimiter) и отдаются на /metrics/ в
+# текстовом формате Prometheus. Включаются настройкой MAILING_METRICS_ENABLED;
+# выключенный MetricsMiddleware убирается из цепочки и ничего не стоит.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+HISTOGRAMS = {
+    "mailing_request_duration_seconds": (
+        "Время обработки запроса, с",
+        DURATION_BUCKETS,
+    ),
+    "mailing_request_queries": ("SQL-запросов за запрос", QUERY_BUCKETS),
+    "mailing_request_sql_seconds": (
+        "Суммарное время SQL-запросов за запрос, с",
+        DURATION_BUCKETS,
+    ),
+}
+CACHE_COUNTER = "mailing_request_cache_total"
+CACHE_COUNTER_HELP = "Обращения к кэшу приложения при обработке запросов"
+
+# Метрики текущего запроса; None, если запрос не измеряется
+current_request = ContextVar("mailing_request_metrics", default=None)
+
+
+class QueryCounter:
+    """Считает запросы к БД и их время через connection.execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class RequestStats(QueryCounter):
+    def __init__(self):
+        super().__init__()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def record_cache_lookup(hit):
+    """Отмечает попадание или промах кэша в метриках текущего запроса."""
+    stats = current_request.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Последний элемент — значения больше верхней границы (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(**labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+class RequestMetrics:
+    """Гистограммы и счётчики по именам представлений."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.cache_lookups = {}
+
+    def observe(self, view, duration, stats):
+        values = {
+            "mailing_request_duration_seconds": duration,
+            "mailing_request_queries": stats.count,
+            "mailing_request_sql_seconds": stats.duration,
+        }
+        with self.lock:
+            for name, value in values.items():
+                histogram = self.histograms.get((name, view))
+                if histogram is None:
+                    histogram = self.histograms[name, view] = Histogram(
+                        HISTOGRAMS[name][1]
+                    )
+                histogram.observe(value)
+            for result, count in (
+                ("hit", stats.cache_hits),
+                ("miss", stats.cache_misses),
+            ):
+                if count:
+                    key = (view, result)
+                    self.cache_lookups[key] = self.cache_lookups.get(key, 0) + count
+
+    def render(self):
+        """Текущие значения в текстовом формате Prometheus (version 0.0.4)."""
+        lines = []
+        with self.lock:
+            for name, (help_text, buckets) in HISTOGRAMS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (metric, view), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    bounds = [*map(str, buckets), "+Inf"]
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        labels = format_labels(view=view, le=bound)
+                        lines.append(f"{name}_bucket{{{labels}}} {cumulative}")
+                    labels = format_labels(view=view)
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            lines += [
+                f"# HELP {CACHE_COUNTER} {CACHE_COUNTER_HELP}",
+                f"# TYPE {CACHE_COUNTER} counter",
+            ]
+            for (view, result), count in sorted(self.cache_lookups.items()):
+                labels = format_labels(view=view, result=result)
+                lines.append(f"{CACHE_COUNTER}{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = RequestMetrics()
+
+
+def has_metrics_token(request):
+    """Проверяет заголовок Authorization: Bearer <MAILING_METRICS_TOKEN>."""
+    token = getattr(settings, "MAILING_METRICS_TOKEN", None)
+    if not token:
+        return False
+    header = request.headers.get("Authorization", "")
+    return hmac.compare_digest(header.encode(), f"Bearer {token}".encode())
+
+
+class MetricsMiddleware:
+    """Измеряет каждый запрос и записывает результат в registry.
+
+    Ставится первым в MIDDLEWARE, чтобы время включало остальные
+    middleware. Для потоковых ответов (выгрузка попыток) учитывается время
+    до начала отдачи, а не вся передача.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "MAILING_METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        registry.observe(match.view_name if match else "unmatched", duration, stats)
+        return response
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает отправки"),
+                            ("processing", "Отправляется"),
+                            ("sent", "Отправлено"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "locked_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Взято в работу"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Создано"),
+                ),
+                (
+                    "mailing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="outbox_jobs",
+                        to="mailing.mailing",
+                        verbose_name="Рассылка",
+                    ),
+                ),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="outbox_jobs",
+                        to="mailing.recipient",
+                        verbose_name="Получатель",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Задание на отправку",
+                "verbose_name_plural": "Очередь отправки",
+                "indexes": [
+                    models.Index(fields=["status", "id"], name="outbox_status_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("mailing", "recipient"), name="unique_outbox_job"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0003_outboxjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(
+                fields=["status", "first_datetime"], name="mailing_status_first_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(
+                fields=["status", "end_datetime"], name="mailing_status_end_idx"
+            ),
+        ),
+    ]
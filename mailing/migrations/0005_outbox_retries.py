@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0004_mailing_schedule_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxjob",
+            name="next_attempt_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Следующая попытка"
+            ),
+        ),
+        migrations.AddField(
+            model_name="outboxjob",
+            name="retries",
+            field=models.PositiveIntegerField(default=0, verbose_name="Повторов"),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0005_outbox_retries"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(
+                fields=["owner", "-first_datetime"], name="mailing_owner_first_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(
+                fields=["owner", "status"], name="mailing_owner_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(fields=["-first_datetime"], name="mailing_first_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="mailingattempt",
+            index=models.Index(
+                fields=["owner", "-attempt_datetime"], name="attempt_owner_datetime_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailingattempt",
+            index=models.Index(
+                fields=["mailing", "-attempt_datetime"],
+                name="attempt_mailing_datetime_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailingattempt",
+            index=models.Index(
+                fields=["-attempt_datetime"], name="attempt_datetime_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipient",
+            index=models.Index(
+                fields=["owner", "email", "full_name"], name="recipient_owner_email_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipient",
+            index=models.Index(fields=["email"], name="recipient_email_idx"),
+        ),
+    ]
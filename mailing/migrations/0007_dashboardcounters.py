@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0006_access_path_indexes"),
+        ("user", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardCounters",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="dashboard_counters",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+                (
+                    "total_mailings",
+                    models.IntegerField(default=0, verbose_name="Всего рассылок"),
+                ),
+                (
+                    "active_mailings",
+                    models.IntegerField(default=0, verbose_name="Активных рассылок"),
+                ),
+                (
+                    "recipients",
+                    models.IntegerField(default=0, verbose_name="Получателей"),
+                ),
+            ],
+            options={
+                "verbose_name": "Счётчики главной страницы",
+                "verbose_name_plural": "Счётчики главной страницы",
+            },
+        ),
+    ]
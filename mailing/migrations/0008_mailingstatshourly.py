@@ -0,0 +1,73 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0007_dashboardcounters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailingStatsHourly",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hour", models.DateTimeField(verbose_name="Час")),
+                (
+                    "success_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Успешно"),
+                ),
+                (
+                    "failed_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Не успешно"),
+                ),
+                (
+                    "mailing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hourly_stats",
+                        to="mailing.mailing",
+                        verbose_name="Рассылка",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mailing_stats",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Почасовая статистика рассылки",
+                "verbose_name_plural": "Почасовая статистика рассылок",
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "mailing"], name="stats_owner_mailing_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("mailing", "hour"), name="unique_mailing_stats_hour"
+                    )
+                ],
+            },
+        ),
+    ]
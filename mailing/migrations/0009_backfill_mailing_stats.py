@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:10
+
+from django.db import migrations
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncHour
+
+
+def backfill_mailing_stats(apps, schema_editor):
+    MailingAttempt = apps.get_model("mailing", "MailingAttempt")
+    MailingStatsHourly = apps.get_model("mailing", "MailingStatsHourly")
+
+    rows = (
+        MailingAttempt.objects.annotate(hour=TruncHour("attempt_datetime"))
+        .values("mailing_id", "hour")
+        .annotate(
+            owner_id=Max("owner_id"),
+            success_count=Count("id", filter=Q(status="success")),
+            failed_count=Count("id", filter=Q(status="failed")),
+        )
+        .order_by()
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=1000):
+        batch.append(MailingStatsHourly(**row))
+        if len(batch) >= 1000:
+            MailingStatsHourly.objects.bulk_create(batch)
+            batch = []
+    MailingStatsHourly.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0008_mailingstatshourly"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_mailing_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0009_backfill_mailing_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipient",
+            name="email_normalized",
+            field=models.CharField(
+                default="",
+                editable=False,
+                max_length=100,
+                verbose_name="Email без учёта регистра",
+            ),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:20
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+BATCH_SIZE = 2000
+
+
+def normalize_email(email):
+    # Копия mailing.models.normalize_email: ключ считается в Python, а не
+    # через LOWER/TRIM базы, которые обрабатывают не-ASCII символы и пробелы
+    # иначе, чем Recipient.save()
+    return (email or "").strip().lower()
+
+
+def merge_duplicate_recipients(apps, schema_editor):
+    Recipient = apps.get_model("mailing", "Recipient")
+    Mailing = apps.get_model("mailing", "Mailing")
+    MailingAttempt = apps.get_model("mailing", "MailingAttempt")
+    OutboxJob = apps.get_model("mailing", "OutboxJob")
+    DashboardCounters = apps.get_model("mailing", "DashboardCounters")
+    Membership = Mailing.recipients.through
+
+    batch = []
+    for recipient in Recipient.objects.only("id", "email").iterator(BATCH_SIZE):
+        recipient.email_normalized = normalize_email(recipient.email)
+        batch.append(recipient)
+        if len(batch) >= BATCH_SIZE:
+            Recipient.objects.bulk_update(batch, ["email_normalized"])
+            batch = []
+    Recipient.objects.bulk_update(batch, ["email_normalized"])
+
+    # Из каждой группы дубликатов остаётся получатель с наименьшим id, а
+    # рассылки, попытки и задания очереди остальных переносятся на него
+    groups = (
+        Recipient.objects.values("owner_id", "email_normalized")
+        .annotate(count=Count("id"), keep_id=Min("id"))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    owner_ids = set()
+    for group in list(groups):
+        duplicate_ids = list(
+            Recipient.objects.filter(
+                owner_id=group["owner_id"],
+                email_normalized=group["email_normalized"],
+            )
+            .exclude(id=group["keep_id"])
+            .values_list("id", flat=True)
+        )
+        keep_id = group["keep_id"]
+
+        mailing_ids = set(
+            Membership.objects.filter(recipient_id=keep_id).values_list(
+                "mailing_id", flat=True
+            )
+        )
+        new_mailing_ids = (
+            set(
+                Membership.objects.filter(recipient_id__in=duplicate_ids).values_list(
+                    "mailing_id", flat=True
+                )
+            )
+            - mailing_ids
+        )
+        Membership.objects.bulk_create(
+            Membership(mailing_id=mailing_id, recipient_id=keep_id)
+            for mailing_id in new_mailing_ids
+        )
+        Membership.objects.filter(recipient_id__in=duplicate_ids).delete()
+
+        MailingAttempt.objects.filter(recipient_id__in=duplicate_ids).update(
+            recipient_id=keep_id
+        )
+
+        # У задания очереди пара (рассылка, получатель) уникальна
+        job_mailing_ids = set(
+            OutboxJob.objects.filter(recipient_id=keep_id).values_list(
+                "mailing_id", flat=True
+            )
+        )
+        for job in OutboxJob.objects.filter(recipient_id__in=duplicate_ids):
+            if job.mailing_id in job_mailing_ids:
+                job.delete()
+            else:
+                job.recipient_id = keep_id
+                job.save(update_fields=["recipient"])
+                job_mailing_ids.add(job.mailing_id)
+
+        Recipient.objects.filter(id__in=duplicate_ids).delete()
+        owner_ids.add(group["owner_id"])
+
+    for owner_id in owner_ids - {None}:
+        DashboardCounters.objects.filter(user_id=owner_id).update(
+            recipients=Recipient.objects.filter(owner_id=owner_id).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0010_recipient_email_normalized"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_recipients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0011_merge_duplicate_recipients"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="recipient",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "email_normalized"), name="unique_owner_email"
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0012_recipient_unique_owner_email"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="mailingattempt",
+            name="attempt_owner_datetime_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="mailingattempt",
+            name="attempt_mailing_datetime_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="mailingattempt",
+            name="attempt_datetime_idx",
+        ),
+        migrations.AddIndex(
+            model_name="mailingattempt",
+            index=models.Index(
+                fields=["owner", "-attempt_datetime", "-id"],
+                name="attempt_owner_datetime_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailingattempt",
+            index=models.Index(
+                fields=["mailing", "-attempt_datetime", "-id"],
+                name="attempt_mailing_datetime_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailingattempt",
+            index=models.Index(
+                fields=["-attempt_datetime", "-id"], name="attempt_datetime_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0013_attempt_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ServerResponse",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("text", models.TextField(verbose_name="Текст ответа")),
+                (
+                    "digest",
+                    models.CharField(
+                        editable=False,
+                        max_length=32,
+                        unique=True,
+                        verbose_name="MD5 текста",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ответ почтового сервера",
+                "verbose_name_plural": "Ответы почтового сервера",
+            },
+        ),
+        migrations.AddField(
+            model_name="mailingattempt",
+            name="response_code",
+            field=models.SmallIntegerField(
+                blank=True, null=True, verbose_name="Код ответа сервера"
+            ),
+        ),
+        migrations.AddField(
+            model_name="mailingattempt",
+            name="response",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="mailing.serverresponse",
+                verbose_name="Ответ почтового сервера",
+            ),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:30
+
+import hashlib
+import re
+from collections import defaultdict
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+# Код ответа в тексте исключений smtplib: "(550, b'...')" или
+# "{'user@example.com': (550, b'...')}"
+CODE_RE = re.compile(r"\((\d{3}),")
+
+
+def intern_server_responses(apps, schema_editor):
+    MailingAttempt = apps.get_model("mailing", "MailingAttempt")
+    ServerResponse = apps.get_model("mailing", "ServerResponse")
+
+    response_ids = {}
+
+    def intern(text):
+        if text not in response_ids:
+            response, _ = ServerResponse.objects.get_or_create(
+                digest=hashlib.md5(text.encode()).hexdigest(), defaults={"text": text}
+            )
+            response_ids[text] = response.id
+        return response_ids[text]
+
+    last_id = 0
+    while True:
+        rows = list(
+            MailingAttempt.objects.filter(id__gt=last_id, response__isnull=True)
+            .order_by("id")
+            .values_list("id", "status", "server_response")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        # Разных ответов в пачке немного: одно UPDATE на каждую пару
+        # (ответ, код) вместо CASE на каждую строку в bulk_update
+        groups = defaultdict(list)
+        for attempt_id, status, text in rows:
+            response_id = intern(text) if text else None
+            if status == "success":
+                code = 250
+            else:
+                match = CODE_RE.search(text or "")
+                code = int(match.group(1)) if match else None
+            groups[response_id, code].append(attempt_id)
+        for (response_id, code), ids in groups.items():
+            MailingAttempt.objects.filter(id__in=ids).update(
+                response_id=response_id, response_code=code
+            )
+        last_id = rows[-1][0]
+
+
+def restore_server_responses(apps, schema_editor):
+    MailingAttempt = apps.get_model("mailing", "MailingAttempt")
+    ServerResponse = apps.get_model("mailing", "ServerResponse")
+
+    for response in ServerResponse.objects.iterator():
+        MailingAttempt.objects.filter(response=response).update(
+            server_response=response.text
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0014_serverresponse"),
+    ]
+
+    operations = [
+        migrations.RunPython(intern_server_responses, restore_server_responses),
+    ]
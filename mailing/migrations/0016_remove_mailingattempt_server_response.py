@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0015_intern_server_responses"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="mailingattempt",
+            name="server_response",
+        ),
+    ]
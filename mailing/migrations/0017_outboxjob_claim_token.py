@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0016_remove_mailingattempt_server_response"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxjob",
+            name="claim_token",
+            field=models.UUIDField(
+                blank=True, editable=False, null=True, verbose_name="Метка пачки"
+            ),
+        ),
+    ]
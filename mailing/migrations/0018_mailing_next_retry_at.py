@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0017_outboxjob_claim_token"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mailing",
+            name="next_retry_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Следующий повтор"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(
+                fields=["status", "next_retry_at"], name="mailing_status_retry_idx"
+            ),
+        ),
+    ]
@@ -1,16 +1,31 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from .letters import PLACEHOLDERS, find_unknown_placeholders
+
 User = get_user_model()  # Получаем модель пользователя
 
 
+def normalize_email(email):
+    """Ключ сравнения адресов: без пробелов по краям и без учёта регистра."""
+    return (email or "").strip().lower()
+
+
 class Recipient(models.Model):
     email = models.EmailField(
         max_length=100,
         verbose_name="Email",
         help_text="Введите адрес электронной почты",
     )
+    email_normalized = models.CharField(
+        max_length=100,
+        editable=False,
+        verbose_name="Email без учёта регистра",
+    )
     full_name = models.CharField(
         max_length=100, verbose_name="Ф.И.О.", help_text="Укажите фамилию и имя"
     )
@@ -38,10 +53,42 @@ class Recipient(models.Model):
             ("view_all_recipients", "Может просматривать всех получателей"),
             ("block_recipient", "Может блокировать получателей"),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "email_normalized"], name="unique_owner_email"
+            ),
+        ]
+        indexes = [
+            # Список получателей пользователя и модераторский список
+            models.Index(
+                fields=["owner", "email", "full_name"], name="recipient_owner_email_idx"
+            ),
+            models.Index(fields=["email"], name="recipient_email_idx"),
+        ]
 
     def __str__(self):
         return f"{self.full_name}, {self.email}"
 
+    def clean(self):
+        super().clean()
+        self.email_normalized = normalize_email(self.email)
+        if (
+            self.owner_id
+            and Recipient.objects.filter(
+                owner_id=self.owner_id, email_normalized=self.email_normalized
+            )
+            .exclude(pk=self.pk)
+            .exists()
+        ):
+            raise ValidationError({"email": "Получатель с таким email уже есть"})
+
+    def save(self, *args, **kwargs):
+        self.email_normalized = normalize_email(self.email)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "email" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "email_normalized"}
+        super().save(*args, **kwargs)
+
 
 class Message(models.Model):
     title = models.CharField(
@@ -70,6 +117,20 @@ class Message(models.Model):
     def __str__(self):
         return self.title
 
+    def clean(self):
+        super().clean()
+        errors = {}
+        for field in ("title", "letter"):
+            unknown = find_unknown_placeholders(getattr(self, field))
+            if unknown:
+                allowed = ", ".join(f"{{{{ {name} }}}}" for name in PLACEHOLDERS)
+                errors[field] = (
+                    f"Неизвестные подстановки: {', '.join(unknown)}. "
+                    f"Доступны: {allowed}"
+                )
+        if errors:
+            raise ValidationError(errors)
+
 
 class Mailing(models.Model):
     STATUS_CHOICES = [
@@ -83,6 +144,11 @@ class Mailing(models.Model):
     status = models.CharField(
         max_length=10, choices=STATUS_CHOICES, default="created", verbose_name="Статус"
     )
+    # Когда у запущенной рассылки наступит пауза перед ближайшим повтором
+    # (start_mailing); по этому времени планировщик запускает её снова
+    next_retry_at = models.DateTimeField(
+        null=True, blank=True, editable=False, verbose_name="Следующий повтор"
+    )
     message = models.ForeignKey(
         Message,
         on_delete=models.CASCADE,
@@ -110,10 +176,62 @@ class Mailing(models.Model):
             ("disable_mailing", "Может отключать рассылки"),
             ("view_mailing_stats", "Может просматривать статистику рассылок"),
         ]
+        indexes = [
+            # Список рассылок пользователя, счётчики на главной, модераторский список
+            models.Index(
+                fields=["owner", "-first_datetime"], name="mailing_owner_first_idx"
+            ),
+            models.Index(fields=["owner", "status"], name="mailing_owner_status_idx"),
+            models.Index(fields=["-first_datetime"], name="mailing_first_idx"),
+            # Планировщик: поиск рассылок, которые пора запустить или остановить
+            models.Index(
+                fields=["status", "first_datetime"], name="mailing_status_first_idx"
+            ),
+            models.Index(
+                fields=["status", "end_datetime"], name="mailing_status_end_idx"
+            ),
+            models.Index(
+                fields=["status", "next_retry_at"], name="mailing_status_retry_idx"
+            ),
+        ]
+
+    # Статус, сохранённый в БД; по нему сигналы считают активные рассылки
+    _loaded_status = None
 
     def __str__(self):
         return f"Рассылка {self.id} ({self.get_status_display()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        if fields is None or "status" in fields:
+            self._loaded_status = self.status
+
+
+class ServerResponse(models.Model):
+    """Текст ответа почтового сервера, общий для всех попыток с таким ответом."""
+
+    text = models.TextField(verbose_name="Текст ответа")
+    digest = models.CharField(
+        max_length=32, unique=True, editable=False, verbose_name="MD5 текста"
+    )
+
+    class Meta:
+        verbose_name = "Ответ почтового сервера"
+        verbose_name_plural = "Ответы почтового сервера"
+
+    def __str__(self):
+        return self.text
+
+    @staticmethod
+    def make_digest(text):
+        return hashlib.md5(text.encode()).hexdigest()
+
 
 class MailingAttempt(models.Model):
     STATUS_CHOICES = [
@@ -127,8 +245,16 @@ class MailingAttempt(models.Model):
     status = models.CharField(
         max_length=7, choices=STATUS_CHOICES, verbose_name="Статус попытки"
     )
-    server_response = models.TextField(
-        verbose_name="Ответ почтового сервера", blank=True, null=True
+    response_code = models.SmallIntegerField(
+        verbose_name="Код ответа сервера", blank=True, null=True
+    )
+    response = models.ForeignKey(
+        ServerResponse,
+        on_delete=models.PROTECT,
+        related_name="+",
+        verbose_name="Ответ почтового сервера",
+        null=True,
+        blank=True,
     )
     mailing = models.ForeignKey(
         Mailing,
@@ -159,6 +285,134 @@ class MailingAttempt(models.Model):
         permissions = [
             ("view_all_attempts", "Может просматривать все попытки рассылок"),
         ]
+        indexes = [
+            # Попытки пользователя, попытки одной рассылки, модераторский список;
+            # id в конце — для постраничного вывода по курсору (дата, id)
+            models.Index(
+                fields=["owner", "-attempt_datetime", "-id"],
+                name="attempt_owner_datetime_idx",
+            ),
+            models.Index(
+                fields=["mailing", "-attempt_datetime", "-id"],
+                name="attempt_mailing_datetime_idx",
+            ),
+            models.Index(
+                fields=["-attempt_datetime", "-id"], name="attempt_datetime_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Попытка {self.id} ({self.get_status_display()})"
+
+    @property
+    def server_response(self):
+        # Текст хранится один раз в ServerResponse; для списков попыток
+        # нужен select_related("response")
+        return self.response.text if self.response_id else None
+
+
+class OutboxJob(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Ожидает отправки"),
+        ("processing", "Отправляется"),
+        ("sent", "Отправлено"),
+        ("failed", "Ошибка"),
+    ]
+
+    mailing = models.ForeignKey(
+        Mailing,
+        on_delete=models.CASCADE,
+        related_name="outbox_jobs",
+        verbose_name="Рассылка",
+    )
+    recipient = models.ForeignKey(
+        Recipient,
+        on_delete=models.CASCADE,
+        related_name="outbox_jobs",
+        verbose_name="Получатель",
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default="pending", verbose_name="Статус"
+    )
+    locked_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Взято в работу"
+    )
+    # Метка пачки, которой воркер забрал задание; статус меняется только с ней
+    claim_token = models.UUIDField(
+        null=True, blank=True, editable=False, verbose_name="Метка пачки"
+    )
+    retries = models.PositiveIntegerField(default=0, verbose_name="Повторов")
+    next_attempt_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Следующая попытка"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+
+    class Meta:
+        verbose_name = "Задание на отправку"
+        verbose_name_plural = "Очередь отправки"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["mailing", "recipient"], name="unique_outbox_job"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["status", "id"], name="outbox_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"Задание {self.id} ({self.get_status_display()})"
+
+
+class DashboardCounters(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="dashboard_counters",
+        verbose_name="Пользователь",
+    )
+    total_mailings = models.IntegerField(default=0, verbose_name="Всего рассылок")
+    active_mailings = models.IntegerField(default=0, verbose_name="Активных рассылок")
+    recipients = models.IntegerField(default=0, verbose_name="Получателей")
+
+    class Meta:
+        verbose_name = "Счётчики главной страницы"
+        verbose_name_plural = "Счётчики главной страницы"
+
+    def __str__(self):
+        return f"Счётчики пользователя {self.user_id}"
+
+
+class MailingStatsHourly(models.Model):
+    mailing = models.ForeignKey(
+        Mailing,
+        on_delete=models.CASCADE,
+        related_name="hourly_stats",
+        verbose_name="Рассылка",
+    )
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="mailing_stats",
+        verbose_name="Владелец",
+        null=True,
+        blank=True,
+    )
+    hour = models.DateTimeField(verbose_name="Час")
+    success_count = models.PositiveIntegerField(default=0, verbose_name="Успешно")
+    failed_count = models.PositiveIntegerField(default=0, verbose_name="Не успешно")
+
+    class Meta:
+        verbose_name = "Почасовая статистика рассылки"
+        verbose_name_plural = "Почасовая статистика рассылок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["mailing", "hour"], name="unique_mailing_stats_hour"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["owner", "mailing"], name="stats_owner_mailing_idx"),
+        ]
+
+    def __str__(self):
+        return f"Статистика рассылки {self.mailing_id} за {self.hour}"
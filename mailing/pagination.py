@@ -0,0 +1,210 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils.functional import cached_property
+
+from .metrics import record_cache_lookup
+
+
+# Постраничный вывод по ключу: вместо OFFSET следующая страница начинается
+# с условия «строки после последней показанной», поэтому любая страница
+# стоит столько же, сколько первая, и COUNT(*) не нужен. Курсор — это
+# значения полей сортировки крайней строки, закодированные в base64.
+
+
+def encode_cursor(direction, values):
+    data = json.dumps([direction, *values], default=str).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor, fields):
+    """Возвращает (направление, значения полей) или None для неверного курсора."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, *values = json.loads(data)
+        if direction not in ("next", "prev") or len(values) != len(fields):
+            return None
+        return direction, [
+            field.to_python(value) for field, value in zip(fields, values)
+        ]
+    except (binascii.Error, ValueError, TypeError, ValidationError):
+        return None
+
+
+def keyset_filter(names, values, descending):
+    """Условие «строка идёт после (names) = (values)» в порядке сортировки.
+
+    Первое поле дополнительно ограничено нестрогим неравенством, чтобы
+    начало диапазона бралось из индекса.
+    """
+    op = "lt" if descending else "gt"
+    condition = Q()
+    for i in range(len(names)):
+        step = Q(**{f"{names[i]}__{op}": values[i]})
+        for name, value in zip(names[:i], values[:i]):
+            step &= Q(**{name: value})
+        condition |= step
+    return Q(**{f"{names[0]}__{op}e": values[0]}) & condition
+
+
+class KeysetPage:
+    """Страница, выбранная по курсору. Поля сортируются по убыванию."""
+
+    def __init__(self, queryset, per_page, names, cursor=None, query=None):
+        self.names = names
+        self.query = query if query is not None else QueryDict()
+        fields = [queryset.model._meta.get_field(name) for name in names]
+        decoded = decode_cursor(cursor, fields) if cursor else None
+        direction, values = decoded or ("next", None)
+
+        descending = direction == "next"
+        ordering = [f"-{name}" if descending else name for name in names]
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(names, values, descending))
+        rows = list(queryset.order_by(*ordering)[: per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+
+        if direction == "next":
+            self.object_list = rows
+            self.has_next_page = has_more
+            self.has_previous_page = values is not None
+        else:
+            self.object_list = rows[::-1]
+            self.has_next_page = True
+            self.has_previous_page = has_more
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page and bool(self.object_list)
+
+    def has_previous(self):
+        return self.has_previous_page and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def cursor_for(self, direction, obj):
+        return encode_cursor(direction, [getattr(obj, name) for name in self.names])
+
+    def link(self, direction, obj):
+        query = self.query.copy()
+        query.pop("page", None)
+        query["cursor"] = self.cursor_for(direction, obj)
+        return query.urlencode()
+
+    @property
+    def next_query(self):
+        return self.link("next", self.object_list[-1]) if self.has_next() else ""
+
+    @property
+    def previous_query(self):
+        return self.link("prev", self.object_list[0]) if self.has_previous() else ""
+
+
+class KeysetPaginationMixin:
+    """Подменяет в ListView постраничный вывод через OFFSET на курсорный.
+
+    В шаблон попадает page_obj с has_next/has_previous и готовыми строками
+    запроса next_query/previous_query (остальные GET-параметры сохраняются).
+    """
+
+    keyset_fields = ("attempt_datetime", "id")
+
+    def paginate_queryset(self, queryset, page_size):
+        page = KeysetPage(
+            queryset,
+            page_size,
+            self.keyset_fields,
+            cursor=self.request.GET.get("cursor"),
+            query=self.request.GET,
+        )
+        return None, page, page.object_list, page.has_other_pages()
+
+
+# Примерное число строк для больших списков: на PostgreSQL — оценка
+# планировщика (EXPLAIN), на других БД — COUNT, закэшированный на
+# MAILING_COUNT_CACHE_TIMEOUT секунд. Каждый раз точно считаются только
+# списки короче MAILING_APPROXIMATE_COUNT_THRESHOLD строк.
+
+
+def estimate_count(queryset):
+    """Оценка числа строк от планировщика PostgreSQL или None."""
+    if connections[queryset.db].vendor != "postgresql":
+        return None
+    try:
+        plan = json.loads(queryset.order_by().explain(format="json"))
+    except (DatabaseError, ValueError):
+        return None
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_cache_key(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    return "count:" + hashlib.md5(f"{queryset.db}|{sql}|{params}".encode()).hexdigest()
+
+
+class ApproximatePage(Page):
+    @property
+    def elided_page_range(self):
+        return self.paginator.get_elided_page_range(self.number)
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator, который не считает строки больших таблиц точно.
+
+    is_approximate показывает, что count — оценка; номер страницы за
+    пределами оценки даёт пустую страницу, а не 404.
+    """
+
+    is_approximate = False
+
+    @cached_property
+    def count(self):
+        threshold = getattr(settings, "MAILING_APPROXIMATE_COUNT_THRESHOLD", 10000)
+        estimate = estimate_count(self.object_list)
+        if estimate is not None:
+            if estimate < threshold:
+                return self.object_list.count()
+            self.is_approximate = True
+            return estimate
+
+        key = count_cache_key(self.object_list)
+        count = cache.get(key)
+        record_cache_lookup(count is not None)
+        if count is not None:
+            self.is_approximate = True
+            return count
+        count = self.object_list.count()
+        if count >= threshold:
+            # Большие таблицы пересчитываются не чаще раза в несколько минут
+            timeout = getattr(settings, "MAILING_COUNT_CACHE_TIMEOUT", 300)
+            cache.set(key, count, timeout)
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Оценка могла оказаться меньше реального числа строк —
+            # страницу за её пределами отдаём (возможно, пустой)
+            if self.is_approximate and int(number) > 1:
+                return int(number)
+            raise
+
+    def _get_page(self, *args, **kwargs):
+        return ApproximatePage(*args, **kwargs)
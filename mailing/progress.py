@@ -0,0 +1,92 @@
+import time
+import uuid
+
+from django.core.cache import cache
+
+
+# Прогресс запусков рассылок хранится в кэше (Redis): счётчики увеличиваются
+# атомарно через incr, а эндпоинт прогресса не трогает таблицу MailingAttempt.
+PROGRESS_TIMEOUT = 60 * 60 * 24
+
+
+def run_key(job_id, name=None):
+    return f"mailing_run:{job_id}:{name}" if name else f"mailing_run:{job_id}"
+
+
+def mailing_key(mailing_id):
+    return f"mailing_run:mailing:{mailing_id}"
+
+
+def start_run(mailing, total=None):
+    """Регистрирует запуск рассылки и возвращает его идентификатор.
+
+    Запуск регистрируется до постановки писем в очередь, чтобы воркеры
+    сразу учитывали отправленные письма; число писем, если оно ещё не
+    известно, задаётся потом через set_run_total.
+    """
+    job_id = uuid.uuid4().hex
+    cache.set_many(
+        {
+            run_key(job_id): {
+                "mailing_id": mailing.id,
+                "owner_id": mailing.owner_id,
+                "total": total,
+                "started_at": time.time(),
+            },
+            run_key(job_id, "sent"): 0,
+            run_key(job_id, "failed"): 0,
+            mailing_key(mailing.id): job_id,
+        },
+        PROGRESS_TIMEOUT,
+    )
+    return job_id
+
+
+def set_run_total(job_id, total):
+    run = cache.get(run_key(job_id))
+    if run is not None:
+        run["total"] = total
+        cache.set(run_key(job_id), run, PROGRESS_TIMEOUT)
+
+
+def record_progress(mailing_id, sent=0, failed=0):
+    """Увеличивает счётчики текущего запуска рассылки, если он есть."""
+    job_id = cache.get(mailing_key(mailing_id))
+    if job_id is None:
+        return
+    for name, value in (("sent", sent), ("failed", failed)):
+        if not value:
+            continue
+        try:
+            cache.incr(run_key(job_id, name), value)
+        except ValueError:
+            # Счётчик истёк вместе с запуском — считать больше нечего
+            return
+
+
+def get_progress(job_id):
+    run = cache.get(run_key(job_id))
+    if run is None:
+        return None
+
+    counters = cache.get_many([run_key(job_id, "sent"), run_key(job_id, "failed")])
+    sent = counters.get(run_key(job_id, "sent"), 0)
+    failed = counters.get(run_key(job_id, "failed"), 0)
+    done = sent + failed
+    # Пока письма ставятся в очередь, их общее число неизвестно
+    remaining = None if run["total"] is None else max(run["total"] - done, 0)
+    elapsed = max(time.time() - run["started_at"], 1e-6)
+    rate = done / elapsed
+
+    return {
+        "job_id": job_id,
+        "mailing_id": run["mailing_id"],
+        "owner_id": run["owner_id"],
+        "total": run["total"],
+        "sent": sent,
+        "failed": failed,
+        "remaining": remaining,
+        "rate": round(rate, 2),
+        "eta": round(remaining / rate, 1) if rate and remaining is not None else None,
+        "finished": remaining == 0,
+    }
@@ -0,0 +1,75 @@
+from django.http import HttpRequest
+
+from .counters import get_count_querysets
+from .models import Mailing, MailingAttempt, Message, Recipient
+from .pagination import KeysetPaginationMixin
+from .views import (
+    AllAttemptsListView,
+    AllMailingsListView,
+    AllRecipientsListView,
+    MailingAttemptListView,
+    MailingListView,
+    MessageListView,
+    RecipientListView,
+)
+
+
+# Запросы списков и пересчёта счётчиков главной страницы, планы которых
+# проверяются через EXPLAIN (команда check_query_plans и тест на PostgreSQL). Полный просмотр этих
+# таблиц на заполненной базе считается ошибкой плана.
+CHECKED_TABLES = [
+    Recipient._meta.db_table,
+    Message._meta.db_table,
+    Mailing._meta.db_table,
+    MailingAttempt._meta.db_table,
+]
+
+LIST_VIEWS = [
+    RecipientListView,
+    MessageListView,
+    MailingListView,
+    MailingAttemptListView,
+    AllMailingsListView,
+    AllRecipientsListView,
+    AllAttemptsListView,
+]
+
+
+def first_page(view):
+    """Queryset первой страницы списка — то, что реально запрашивает ListView."""
+    queryset = view.get_queryset()
+    if isinstance(view, KeysetPaginationMixin):
+        queryset = queryset.order_by(*[f"-{name}" for name in view.keyset_fields])
+    return queryset[: view.paginate_by]
+
+
+def list_view(view_class, user, **params):
+    """Представление списка, настроенное на запрос пользователя user."""
+    request = HttpRequest()
+    request.user = user
+    request.GET.update(params)
+    view = view_class()
+    view.setup(request)
+    return view
+
+
+def get_querysets(user):
+    """Пары (название, queryset) для проверки от имени пользователя user."""
+    for view_class in LIST_VIEWS:
+        yield view_class.__name__, first_page(list_view(view_class, user))
+
+    mailing = Mailing.objects.filter(owner=user).first()
+    if mailing:
+        view = list_view(MailingAttemptListView, user, mailing_id=mailing.id)
+        yield "MailingAttemptListView?mailing_id", first_page(view)
+
+    # Главная страница читает готовые счётчики; по таблицам они считаются
+    # только при пересчёте (get_counters для нового пользователя)
+    mailings, recipients = get_count_querysets([user.id])
+    yield "rebuild_counters: mailings", mailings
+    yield "rebuild_counters: recipients", recipients
+
+
+def find_seq_scans(plan):
+    """Таблицы из CHECKED_TABLES, которые план EXPLAIN просматривает целиком."""
+    return [table for table in CHECKED_TABLES if f"Seq Scan on {table}" in plan]
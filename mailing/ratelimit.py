@@ -0,0 +1,163 @@
+import threading
+import time
+
+from django.conf import settings
+
+
+# Проверка и резервирование всех корзин письма за один атомарный вызов Redis.
+# KEYS — ключи корзин, ARGV — пары (интервал между письмами в мкс, всплеск).
+# Время берётся с сервера Redis, поэтому часы воркеров не обязаны совпадать.
+# Возвращает, сколько микросекунд подождать перед отправкой.
+GCRA_SCRIPT = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000000 + tonumber(time[2])
+local at = now
+local tats = {}
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[i * 2 - 1])
+    local burst = tonumber(ARGV[i * 2])
+    local value = redis.call("GET", key)
+    tats[i] = value and tonumber(value) or 0
+    at = math.max(at, tats[i] - (burst - 1) * interval)
+end
+for i, key in ipairs(KEYS) do
+    local tat = math.max(tats[i], at) + tonumber(ARGV[i * 2 - 1])
+    local ttl = math.ceil((tat - now) / 1000) + 1000
+    redis.call("SET", key, string.format("%d", tat), "PX", string.format("%d", ttl))
+end
+return at - now
+"""
+
+
+class TokenBucket:
+    """Token bucket, реализованный через время «теоретического прибытия» (GCRA).
+
+    rate — токенов в секунду, burst — сколько писем можно отправить подряд
+    без паузы.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.interval = 1.0 / rate
+        self.burst = max(1, burst)
+        self.tat = 0.0
+
+    def earliest(self, now):
+        return max(now, self.tat - (self.burst - 1) * self.interval)
+
+    def take(self, at):
+        self.tat = max(self.tat, at) + self.interval
+
+
+class RateLimiter:
+    """Ограничитель скорости отправки: общий, на владельца и на домен получателя.
+
+    Лимиты задаются настройкой MAILING_RATE_LIMITS. Корзины хранятся в памяти:
+    один экземпляр разделяют все потоки и асинхронные сессии процесса, но
+    при нескольких процессах лимиты действуют в каждом отдельно — для них
+    есть RedisRateLimiter.
+    """
+
+    max_buckets = 10000
+    # reserve() обращается к сети, и асинхронный пул вызывает его в потоке
+    blocking = False
+
+    def __init__(self, limits):
+        self.limits = {scope: limit for scope, limit in limits.items() if limit}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(self, scope, key):
+        bucket = self.buckets.get((scope, key))
+        if bucket is None:
+            bucket = self.buckets[(scope, key)] = TokenBucket(*self.limits[scope])
+        return bucket
+
+    def prune(self, now):
+        # Пустые (полностью восстановившиеся) корзины не отличаются от новых
+        for bucket_key, bucket in list(self.buckets.items()):
+            if bucket.tat <= now:
+                del self.buckets[bucket_key]
+
+    def get_keys(self, owner_id, email):
+        """Пары (область, ключ корзины) для письма."""
+        keys = {
+            "global": "",
+            "owner": owner_id,
+            "domain": email.rpartition("@")[2].lower(),
+        }
+        return [(scope, keys[scope]) for scope in self.limits if scope in keys]
+
+    def reserve(self, owner_id, email):
+        """Резервирует отправку письма и возвращает, сколько секунд нужно подождать."""
+        if not self.limits:
+            return 0.0
+
+        with self.lock:
+            now = time.monotonic()
+            if len(self.buckets) > self.max_buckets:
+                self.prune(now)
+            buckets = [
+                self.get_bucket(scope, key)
+                for scope, key in self.get_keys(owner_id, email)
+            ]
+            at = max(bucket.earliest(now) for bucket in buckets)
+            for bucket in buckets:
+                bucket.take(at)
+        return at - now
+
+    def acquire(self, owner_id, email):
+        delay = self.reserve(owner_id, email)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RedisRateLimiter(RateLimiter):
+    """Ограничитель, корзины которого хранятся в Redis и общие для всех процессов.
+
+    Каждая корзина — ключ со временем «теоретического прибытия» в
+    микросекундах; GCRA_SCRIPT проверяет и сдвигает все корзины письма
+    атомарно, поэтому run_mailing_worker на разных машинах вместе не
+    превышают заданной скорости.
+    """
+
+    blocking = True
+    key_prefix = "mailing:ratelimit"
+
+    def __init__(self, limits, url):
+        import redis
+
+        super().__init__(limits)
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(GCRA_SCRIPT)
+
+    def reserve(self, owner_id, email):
+        if not self.limits:
+            return 0.0
+
+        keys = []
+        args = []
+        for scope, key in self.get_keys(owner_id, email):
+            rate, burst = self.limits[scope]
+            keys.append(f"{self.key_prefix}:{scope}:{key}")
+            args += [round(1_000_000 / rate), max(1, burst)]
+        return self.script(keys=keys, args=args) / 1_000_000
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Общий ограничитель процесса по настройкам MAILING_RATE_LIMITS.
+
+    Если задан MAILING_RATE_LIMIT_REDIS_URL, корзины хранятся в Redis.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            limits = getattr(settings, "MAILING_RATE_LIMITS", {})
+            url = getattr(settings, "MAILING_RATE_LIMIT_REDIS_URL", None)
+            _limiter = RateLimiter(limits)
+            if _limiter.limits and url:
+                _limiter = RedisRateLimiter(limits, url)
+        return _limiter
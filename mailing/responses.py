@@ -0,0 +1,78 @@
+import re
+import smtplib
+import threading
+
+from django.db import transaction
+
+from .models import ServerResponse
+
+
+# Ответы сервера повторяются (успешная отправка, несколько типовых ошибок),
+# поэтому текст хранится один раз в ServerResponse, а попытка ссылается на
+# него. Код ответа хранится в самой попытке, а из текста ошибки убираются
+# адреса получателей, иначе у каждого отказа был бы свой текст. Известные
+# тексты держатся в памяти процесса, и в обычной рассылке запросов к
+# ServerResponse нет совсем.
+SUCCESS_RESPONSE = "Письмо успешно отправлено"
+MAX_CACHED_RESPONSES = 10000
+
+ADDRESS_RE = re.compile(r"<?[^\s<>()\[\],;:\"']+@[^\s<>()\[\],;:\"']+>?")
+ADDRESS_PLACEHOLDER = "<адрес>"
+
+_response_ids = {}
+_lock = threading.Lock()
+
+
+def remember_response(text, response_id):
+    with _lock:
+        if len(_response_ids) >= MAX_CACHED_RESPONSES:
+            # Защита от неожиданно разнообразных ответов сервера
+            _response_ids.clear()
+        _response_ids[text] = response_id
+
+
+def intern_response(text):
+    """Возвращает id записи ServerResponse с этим текстом, создавая её при необходимости."""
+    response_id = _response_ids.get(text)
+    if response_id is None:
+        response, _ = ServerResponse.objects.get_or_create(
+            digest=ServerResponse.make_digest(text), defaults={"text": text}
+        )
+        response_id = response.id
+        # Запись могла быть создана в транзакции, которая ещё откатится,
+        # поэтому id запоминается только после фиксации
+        transaction.on_commit(lambda: remember_response(text, response_id))
+    return response_id
+
+
+def decode_reply(text):
+    if isinstance(text, bytes):
+        return text.decode("utf-8", "replace")
+    return str(text)
+
+
+def describe_error(error):
+    """Текст ошибки отправки для ServerResponse: ответ сервера без кода и адресов.
+
+    Одинаковые отказы для разных получателей дают один и тот же текст.
+    """
+    if isinstance(error, smtplib.SMTPResponseException):
+        text = decode_reply(error.smtp_error)
+    elif isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        text = decode_reply(next(iter(error.recipients.values()))[1])
+    else:
+        text = str(error)
+    return ADDRESS_RE.sub(ADDRESS_PLACEHOLDER, text).strip() or type(error).__name__
+
+
+def get_response_code(error):
+    """SMTP-код ответа: 250 для успешной отправки, код ошибки сервера или None."""
+    if error is None:
+        return 250
+    if isinstance(error, smtplib.SMTPResponseException):
+        code = error.smtp_code
+    elif isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        code = next(iter(error.recipients.values()))[0]
+    else:
+        return None
+    return code if 0 < code < 1000 else None
@@ -0,0 +1,185 @@
+import gzip
+import io
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .caching import invalidate_user_cache
+from .models import MailingAttempt
+from .pagination import keyset_filter
+
+
+# Старые попытки переносятся в сжатые файлы по месяцам и удаляются пачками.
+# Каждый запуск пишет свои файлы (attempts-ГГГГ-ММ-<время запуска>.ndjson.gz,
+# по строке JSON на попытку): сначала во временные, которые после записи всех
+# строк сбрасываются на диск и переименовываются, и только потом попытки
+# удаляются из БД. При сбое до переименования в БД ничего не удалено, при
+# сбое во время удаления оставшиеся строки попадут в архив следующего запуска
+# повторно, но не пропадут. Готовые архивы больше не изменяются.
+# Почасовая статистика (MailingStatsHourly) хранится отдельно и не меняется.
+ARCHIVE_COLUMNS = [
+    "id",
+    "attempt_datetime",
+    "status",
+    "response_code",
+    "mailing_id",
+    "recipient_id",
+    "recipient__email",
+    "owner_id",
+]
+
+# Текст ответа сервера пишется в архив целиком, а не ссылкой
+ARCHIVE_EXPRESSIONS = {"server_response": F("response__text")}
+
+KEYSET = ("attempt_datetime", "id")
+
+
+def get_retention_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, "MAILING_ATTEMPT_RETENTION_DAYS", 180)
+    return timezone.now() - timedelta(days=days)
+
+
+def delete_rows(model, values, field_name="pk"):
+    """Удаляет строки, у которых поле field_name входит в values.
+
+    Удаление одним DELETE, без загрузки объектов, каскадов и сигналов
+    post_delete — связанные строки и кэш вызывающий код обрабатывает сам.
+    """
+    values = list(values)
+    if not values:
+        return 0
+    field = model._meta.pk if field_name == "pk" else model._meta.get_field(field_name)
+    quote = connection.ops.quote_name
+    placeholders = ", ".join(["%s"] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} "
+            f"WHERE {quote(field.column)} IN ({placeholders})",
+            values,
+        )
+        return cursor.rowcount
+
+
+class AttemptArchive:
+    """Архивы попыток одного запуска, по файлу на месяц.
+
+    Файлы пишутся с суффиксом .tmp и становятся архивами только в commit();
+    при выходе из блока with без commit() временные файлы удаляются.
+    """
+
+    def __init__(self, directory, run_id=None):
+        self.directory = directory
+        self.run_id = run_id or f"{timezone.now():%Y%m%d-%H%M%S-%f}"
+        self.files = {}
+
+    def path(self, month):
+        return os.path.join(self.directory, f"attempts-{month}-{self.run_id}.ndjson.gz")
+
+    def write(self, row):
+        month = f"{row['attempt_datetime']:%Y-%m}"
+        file = self.files.get(month)
+        if file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            raw = open(self.path(month) + ".tmp", "wb")
+            text = io.TextIOWrapper(
+                gzip.GzipFile(fileobj=raw, mode="wb"), encoding="utf-8"
+            )
+            file = self.files[month] = (raw, text)
+        file[1].write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n")
+
+    def commit(self):
+        """Дописывает, сбрасывает на диск и переименовывает архивы; возвращает пути."""
+        paths = []
+        for month, (raw, text) in self.files.items():
+            # Закрывается только gzip-поток: raw передан в GzipFile снаружи
+            text.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+            raw.close()
+            os.replace(self.path(month) + ".tmp", self.path(month))
+            paths.append(self.path(month))
+        if paths:
+            # Переименование надёжно только после fsync самого каталога
+            directory = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+        self.files = {}
+        return paths
+
+    def discard(self):
+        for month, (raw, text) in self.files.items():
+            text.close()
+            raw.close()
+            os.remove(self.path(month) + ".tmp")
+        self.files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.discard()
+
+
+def iterate_batches(queryset, fields, batch_size, upto=None, expressions=None):
+    """Словари со строками queryset пачками в порядке KEYSET, не дальше ключа upto."""
+    queryset = queryset.order_by(*KEYSET)
+    if upto is not None:
+        queryset = queryset.exclude(keyset_filter(KEYSET, upto, descending=False))
+    last = None
+    while True:
+        batch = queryset
+        if last is not None:
+            # Продолжаем после последней строки, не просматривая удалённые
+            batch = batch.filter(keyset_filter(KEYSET, last, descending=False))
+        rows = list(batch.values(*fields, **(expressions or {}))[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last = [rows[-1][name] for name in KEYSET]
+
+
+def archive_attempts(before, directory=None, batch_size=None, archive=True):
+    """Архивирует и удаляет попытки старше before.
+
+    Возвращает словарь {месяц: число попыток}. При archive=False попытки
+    удаляются без записи в файлы.
+    """
+    directory = directory or getattr(
+        settings, "MAILING_ARCHIVE_DIR", os.path.join(settings.BASE_DIR, "archive")
+    )
+    batch_size = batch_size or getattr(settings, "MAILING_ARCHIVE_BATCH_SIZE", 5000)
+    queryset = MailingAttempt.objects.filter(attempt_datetime__lt=before)
+    last = None
+
+    if archive:
+        with AttemptArchive(directory) as files:
+            for rows in iterate_batches(
+                queryset, ARCHIVE_COLUMNS, batch_size, expressions=ARCHIVE_EXPRESSIONS
+            ):
+                for row in rows:
+                    files.write(row)
+                last = [rows[-1][name] for name in KEYSET]
+            files.commit()
+        if last is None:
+            return {}
+
+    # Удаляются только строки, попавшие в архив (не дальше последней из них)
+    counts = {}
+    for rows in iterate_batches(queryset, ["owner_id", *KEYSET], batch_size, upto=last):
+        with transaction.atomic():
+            delete_rows(MailingAttempt, [row["id"] for row in rows])
+        # post_delete не отправляется — кэш владельцев сбрасываем раз на пачку
+        invalidate_user_cache(*{row["owner_id"] for row in rows})
+        for row in rows:
+            month = f"{row['attempt_datetime']:%Y-%m}"
+            counts[month] = counts.get(month, 0) + 1
+    return counts
@@ -0,0 +1,811 @@
+import asyncio
+import logging
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Q
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .caching import invalidate_user_cache
+from .counters import adjust_counters
+from .letters import LetterTemplate
+from .models import Mailing, MailingAttempt, OutboxJob
+from .progress import record_progress
+from .ratelimit import get_rate_limiter
+from .responses import (
+    SUCCESS_RESPONSE,
+    describe_error,
+    get_response_code,
+    intern_response,
+)
+from .stats import record_stats
+from .smtp_async import AsyncSMTPSession
+
+
+logger = logging.getLogger(__name__)
+
+
+class ManagedConnection:
+    """Одно SMTP-соединение на весь прогон рассылки.
+
+    Соединение открывается при первой отправке, переиспользуется для
+    следующих писем и переоткрывается после обрыва или после
+    MAILING_MESSAGES_PER_CONNECTION отправленных писем.
+
+    connection_options — аргументы get_connection (backend, host, port и
+    т. д.); по умолчанию используются настройки EMAIL_*.
+    """
+
+    def __init__(self, max_messages=None, connection_options=None):
+        self.max_messages = max_messages or getattr(
+            settings, "MAILING_MESSAGES_PER_CONNECTION", 100
+        )
+        self.connection_options = connection_options or {}
+        self.connection = None
+        self.sent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        self.connection = get_connection(fail_silently=False, **self.connection_options)
+        self.connection.open()
+        self.sent = 0
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.close()
+        except Exception as e:
+            logger.warning(f"Ошибка при закрытии SMTP-соединения: {str(e)}")
+        self.connection = None
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+    def send(self, message):
+        if self.connection is None or self.sent >= self.max_messages:
+            self.reconnect()
+
+        try:
+            self.connection.send_messages([message])
+        except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+            # Сервер закрыл соединение — переподключаемся и повторяем один раз
+            logger.warning(f"SMTP-соединение потеряно, переподключение: {str(e)}")
+            self.reconnect()
+            self.connection.send_messages([message])
+
+        self.sent += 1
+
+
+class AttemptBuffer:
+    """Буфер попыток рассылки, записываемых в БД пачками через bulk_create.
+
+    Пачка сбрасывается при достижении MAILING_ATTEMPT_BATCH_SIZE записей, не
+    реже раза в flush_interval секунд (если задан) и при выходе из блока with
+    (в том числе по исключению). Если процесс аварийно завершится, будет
+    потеряно не более одной незаписанной пачки. on_flush(attempts)
+    вызывается в одной транзакции с записью пачки.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, on_flush=None):
+        self.batch_size = batch_size or getattr(
+            settings, "MAILING_ATTEMPT_BATCH_SIZE", 500
+        )
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.flushed_at = time.monotonic()
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def add(self, **fields):
+        self.pending.append(MailingAttempt(**fields))
+        if len(self.pending) >= self.batch_size or (
+            self.flush_interval
+            and time.monotonic() - self.flushed_at >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        self.flushed_at = time.monotonic()
+        if not self.pending:
+            return
+        with transaction.atomic():
+            MailingAttempt.objects.bulk_create(self.pending)
+            record_stats(self.pending)
+            if self.on_flush:
+                self.on_flush(self.pending)
+        # bulk_create не отправляет сигналы — сбрасываем кэш страниц вручную
+        invalidate_user_cache(*(attempt.owner_id for attempt in self.pending))
+        self.pending = []
+
+
+class DeliveryPool:
+    """Пул потоков отправки писем.
+
+    У каждого потока своё SMTP-соединение (ManagedConnection), скорость
+    отправки ограничивается общим RateLimiter (get_rate_limiter). В работе
+    одновременно держится не больше 2 * concurrency писем, поэтому память
+    не зависит от размера списка получателей. Результаты отдаются в
+    вызывающий поток, который и пишет попытки в БД.
+
+    Если timings — список, в него добавляется длительность отправки каждого
+    письма в секундах без ожидания RateLimiter (см. bench_mailing).
+    max_messages и connection_options передаются в ManagedConnection.
+    """
+
+    def __init__(
+        self,
+        concurrency=1,
+        limiter=None,
+        timings=None,
+        connection_options=None,
+        max_messages=None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.limiter = limiter or get_rate_limiter()
+        self.timings = timings
+        self.connection_options = connection_options
+        self.max_messages = max_messages
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def get_connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = ManagedConnection(self.max_messages, self.connection_options)
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def send(self, message, owner_id):
+        self.limiter.acquire(owner_id, message.recipients()[0])
+        started = time.perf_counter()
+        try:
+            self.get_connection().send(message)
+        finally:
+            if self.timings is not None:
+                self.timings.append(time.perf_counter() - started)
+
+    def run(self, letters):
+        """Отправляет тройки (ключ, письмо, ID владельца).
+
+        Выдаёт пары (ключ, исключение или None).
+        """
+        try:
+            if self.concurrency == 1:
+                for key, message, owner_id in letters:
+                    try:
+                        self.send(message, owner_id)
+                    except Exception as e:
+                        yield key, e
+                    else:
+                        yield key, None
+                return
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                pending = {}
+                for key, message, owner_id in letters:
+                    pending[executor.submit(self.send, message, owner_id)] = key
+                    if len(pending) >= self.concurrency * 2:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield pending.pop(future), future.exception()
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.exception()
+        finally:
+            for connection in self.connections:
+                connection.close()
+
+
+class AsyncDeliveryPool:
+    """Асинхронная отправка: много SMTP-сессий в одном цикле событий.
+
+    Цикл asyncio работает в отдельном потоке, а получатели читаются из БД
+    в вызывающем потоке (ORM Django нельзя вызывать внутри цикла событий).
+    Интерфейс run() и параметры timings, connection_options и max_messages
+    совпадают с DeliveryPool; из connection_options берутся параметры SMTP (host, port,
+    username, password, use_tls, use_ssl, timeout), backend не используется.
+    """
+
+    def __init__(
+        self,
+        concurrency=100,
+        limiter=None,
+        timings=None,
+        connection_options=None,
+        max_messages=None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.limiter = limiter or get_rate_limiter()
+        self.timings = timings
+        self.session_options = {
+            name: value
+            for name, value in (connection_options or {}).items()
+            if name != "backend"
+        }
+        self.session_options["max_messages"] = max_messages
+
+    async def worker(self, jobs, results):
+        session = AsyncSMTPSession(**self.session_options)
+        try:
+            while True:
+                job = await jobs.get()
+                if job is None:
+                    break
+                key, message, owner_id = job
+                try:
+                    if self.limiter.blocking:
+                        delay = await asyncio.to_thread(
+                            self.limiter.reserve, owner_id, message.recipients()[0]
+                        )
+                    else:
+                        delay = self.limiter.reserve(owner_id, message.recipients()[0])
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    started = time.perf_counter()
+                    try:
+                        await session.send(message)
+                    finally:
+                        if self.timings is not None:
+                            self.timings.append(time.perf_counter() - started)
+                except Exception as e:
+                    results.put((key, e))
+                else:
+                    results.put((key, None))
+        finally:
+            await session.close()
+
+    async def cancel_all(self):
+        tasks = [
+            task for task in asyncio.all_tasks() if task is not asyncio.current_task()
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run(self, letters):
+        """Отправляет тройки (ключ, письмо, ID владельца).
+
+        Выдаёт пары (ключ, исключение или None).
+        """
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        def call(coroutine):
+            return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+        async def make_queue():
+            return asyncio.Queue(maxsize=self.concurrency * 2)
+
+        results = queue.Queue()
+        jobs = call(make_queue())
+        workers = [
+            asyncio.run_coroutine_threadsafe(self.worker(jobs, results), loop)
+            for _ in range(self.concurrency)
+        ]
+        in_flight = 0
+        finished = False
+        try:
+            for job in letters:
+                # put() ждёт свободного места в очереди — это и есть backpressure
+                call(jobs.put(job))
+                in_flight += 1
+                while True:
+                    try:
+                        result = results.get_nowait()
+                    except queue.Empty:
+                        break
+                    in_flight -= 1
+                    yield result
+            for _ in workers:
+                call(jobs.put(None))
+            while in_flight:
+                in_flight -= 1
+                yield results.get()
+            finished = True
+        finally:
+            if finished:
+                for worker in workers:
+                    worker.result()
+            else:
+                call(self.cancel_all())
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+
+def build_letter(mailing, recipient):
+    """Письмо получателю рассылки.
+
+    Сообщение рассылки кодируется один раз на версию текста (шаблоны
+    кэшируются в процессе), для получателя подставляются только его данные.
+    """
+    return LetterTemplate.for_mailing(mailing).for_recipient(recipient)
+
+
+def get_pool(concurrency=None, use_async=False, **kwargs):
+    if use_async:
+        return AsyncDeliveryPool(
+            concurrency or getattr(settings, "MAILING_ASYNC_CONCURRENCY", 100), **kwargs
+        )
+    return DeliveryPool(
+        concurrency or getattr(settings, "MAILING_CONCURRENCY", 1), **kwargs
+    )
+
+
+def record_attempt(attempts, mailing, recipient, error):
+    """Записывает попытку отправки в буфер; возвращает True, если письмо ушло."""
+    if error is None:
+        attempts.add(
+            status="success",
+            mailing=mailing,
+            recipient=recipient,
+            response_id=intern_response(SUCCESS_RESPONSE),
+            response_code=get_response_code(error),
+            owner=mailing.owner,
+        )
+        return True
+
+    logger.error(f"Ошибка отправки письма для {recipient.email}: {str(error)}")
+    attempts.add(
+        status="failed",
+        mailing=mailing,
+        recipient=recipient,
+        response_id=intern_response(describe_error(error)),
+        response_code=get_response_code(error),
+        owner=mailing.owner,
+    )
+    return False
+
+
+def get_retry_delay(failures):
+    """Пауза перед повтором после failures неудачных попыток (экспоненциальная)."""
+    base = getattr(settings, "MAILING_RETRY_BACKOFF", 60)
+    limit = getattr(settings, "MAILING_RETRY_BACKOFF_MAX", 6 * 60 * 60)
+    return timedelta(seconds=min(base * 2 ** (failures - 1), limit))
+
+
+def get_undelivered_recipients(mailing):
+    """Получатели рассылки без успешной попытки.
+
+    Каждый получатель аннотирован числом неудачных попыток (failures) и
+    временем последней из них (last_failure).
+    """
+    failed = Q(mailingattempt__mailing=mailing, mailingattempt__status="failed")
+    delivered = MailingAttempt.objects.filter(
+        mailing=mailing, status="success", recipient__isnull=False
+    ).values("recipient_id")
+    return mailing.recipients.exclude(id__in=delivered).annotate(
+        failures=Count("mailingattempt", filter=failed),
+        last_failure=Max("mailingattempt__attempt_datetime", filter=failed),
+    )
+
+
+def start_mailing(mailing_id, concurrency=None, use_async=False, pool=None):
+    """Отправляет письма получателям, которым рассылка ещё не доставлена.
+
+    Успешно получившие письмо пропускаются, упавшие повторяются не более
+    MAILING_MAX_RETRIES раз с экспоненциальной паузой (get_retry_delay).
+    Рассылка остаётся в статусе "started", пока есть кому повторять отправку,
+    а в next_retry_at записывается, когда наступит ближайший повтор.
+    Готовый пул отправки можно передать в pool вместо concurrency/use_async,
+    например с другим почтовым сервером (connection_options в get_pool).
+    """
+    pool = pool or get_pool(concurrency, use_async)
+    max_retries = getattr(settings, "MAILING_MAX_RETRIES", 5)
+    now = timezone.now()
+
+    try:
+        mailing = Mailing.objects.select_related("message").get(id=mailing_id)
+
+        success_count = 0
+        failed_count = 0
+        waiting_count = 0
+        exhausted_count = 0
+        retry_count = 0
+        retry_times = []
+        retry_delays = set()
+
+        # Читаем только нужные колонки порциями (на PostgreSQL — серверным
+        # курсором), чтобы память не зависела от размера списка
+        recipients = (
+            get_undelivered_recipients(mailing)
+            .only("id", "email", "full_name")
+            .order_by()
+            .iterator(
+                chunk_size=getattr(settings, "MAILING_RECIPIENT_CHUNK_SIZE", 2000)
+            )
+        )
+
+        def due_recipients():
+            nonlocal waiting_count, exhausted_count
+            for recipient in recipients:
+                if recipient.failures > max_retries:
+                    exhausted_count += 1
+                    continue
+                if recipient.failures:
+                    retry_at = recipient.last_failure + get_retry_delay(
+                        recipient.failures
+                    )
+                    if retry_at > now:
+                        waiting_count += 1
+                        retry_times.append(retry_at)
+                        continue
+                yield recipient
+
+        letters = (
+            (recipient, build_letter(mailing, recipient), mailing.owner_id)
+            for recipient in due_recipients()
+        )
+        with AttemptBuffer() as attempts:
+            for recipient, error in pool.run(letters):
+                if record_attempt(attempts, mailing, recipient, error):
+                    success_count += 1
+                else:
+                    failed_count += 1
+                    if recipient.failures + 1 <= max_retries:
+                        retry_count += 1
+                        retry_delays.add(get_retry_delay(recipient.failures + 1))
+
+        # Время попыток проставляется при записи пачки, поэтому паузы
+        # отсчитываются от момента после записи последней из них
+        finished = timezone.now()
+        retry_times += [finished + delay for delay in retry_delays]
+        total_recipients = success_count + failed_count
+        all_successful = failed_count == 0
+        mailing.status = "started" if waiting_count or retry_count else "completed"
+        mailing.next_retry_at = min(retry_times, default=None)
+        mailing.save()
+
+        if total_recipients == 0 and waiting_count:
+            message = "Нет получателей, готовых к повторной отправке"
+        elif total_recipients == 0 and exhausted_count:
+            message = "Повторы для недоставленных писем исчерпаны"
+        elif total_recipients == 0:
+            message = "Нет получателей для рассылки"
+        elif all_successful:
+            message = "Рассылка завершена успешно"
+        else:
+            message = "Рассылка завершена с ошибками"
+
+        return {
+            "total": total_recipients,
+            "success": success_count,
+            "failed": failed_count,
+            "all_successful": all_successful,
+            "status": mailing.status,
+            "message": message,
+        }
+
+    except Mailing.DoesNotExist:
+        logger.error(f"Рассылка с ID {mailing_id} не найдена")
+        return {"status": "error", "message": f"Рассылка с ID {mailing_id} не найдена"}
+    except Exception as e:
+        logger.error(f"Ошибка при выполнении рассылки: {str(e)}")
+        return {"status": "error", "message": f"Произошла ошибка: {str(e)}"}
+
+
+def insert_outbox_jobs(mailing):
+    """Создаёт задания OutboxJob для недоставленных получателей рассылки.
+
+    Один запрос INSERT ... SELECT из таблицы связи рассылки с получателями:
+    строки не проходят через Python, поэтому время не зависит от размера
+    списка. Уже существующие задания не дублируются. Возвращает число
+    созданных заданий.
+    """
+    quote = connection.ops.quote_name
+
+    def column(model, name):
+        return quote(model._meta.get_field(name).column)
+
+    through = Mailing.recipients.through
+    link_mailing = f"link.{column(through, 'mailing')}"
+    link_recipient = f"link.{column(through, 'recipient')}"
+    columns = ", ".join(
+        column(OutboxJob, name)
+        for name in ("mailing", "recipient", "status", "retries", "created_at")
+    )
+    delivered = (
+        f"SELECT 1 FROM {quote(MailingAttempt._meta.db_table)} attempt "
+        f"WHERE attempt.{column(MailingAttempt, 'mailing')} = {link_mailing} "
+        f"AND attempt.{column(MailingAttempt, 'recipient')} = {link_recipient} "
+        f"AND attempt.{column(MailingAttempt, 'status')} = %s"
+    )
+    sql = (
+        f"{connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)} "
+        f"{quote(OutboxJob._meta.db_table)} ({columns}) "
+        f"SELECT {link_mailing}, {link_recipient}, %s, 0, %s "
+        f"FROM {quote(through._meta.db_table)} link "
+        f"WHERE {link_mailing} = %s AND NOT EXISTS ({delivered}) "
+        + connection.ops.on_conflict_suffix_sql([], OnConflict.IGNORE, None, None)
+    )
+    params = [
+        "pending",
+        connection.ops.adapt_datetimefield_value(timezone.now()),
+        mailing.id,
+        "success",
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def enqueue_mailing(mailing_id):
+    """Ставит письма рассылки в очередь OutboxJob для run_mailing_worker.
+
+    Получатели, которым письмо уже доставлено, пропускаются, задания,
+    исчерпавшие повторы, возвращаются в очередь со сброшенным счётчиком.
+    Число запросов не зависит от размера списка получателей. Возвращает
+    количество заданий, ожидающих отправки.
+    """
+    mailing = Mailing.objects.get(id=mailing_id)
+
+    with transaction.atomic():
+        insert_outbox_jobs(mailing)
+        OutboxJob.objects.filter(mailing=mailing, status="failed").update(
+            status="pending", locked_at=None, retries=0, next_attempt_at=None
+        )
+        mailing.status = "started"
+        mailing.save(update_fields=["status"])
+        # Считаем до фиксации: после неё воркеры уже могут забирать задания
+        return OutboxJob.objects.filter(
+            mailing=mailing, status__in=["pending", "processing"]
+        ).count()
+
+
+def claim_outbox_jobs(batch_size, mailing_id=None):
+    """Забирает пачку заданий из очереди.
+
+    Строки блокируются через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    несколько воркеров на разных машинах получают непересекающиеся пачки.
+    Задания, зависшие в статусе "processing" дольше
+    MAILING_OUTBOX_LOCK_TIMEOUT секунд (упавший воркер), забираются повторно.
+    Заданиям пачки ставится общая метка claim_token: после повторного
+    захвата прежний воркер уже не может изменить их статус.
+    """
+    now = timezone.now()
+    stale = now - timedelta(
+        seconds=getattr(settings, "MAILING_OUTBOX_LOCK_TIMEOUT", 600)
+    )
+    queryset = OutboxJob.objects.filter(
+        Q(status="pending", next_attempt_at__isnull=True)
+        | Q(status="pending", next_attempt_at__lte=now)
+        | Q(status="processing", locked_at__lt=stale)
+    )
+    if mailing_id:
+        queryset = queryset.filter(mailing_id=mailing_id)
+
+    token = uuid.uuid4()
+    with transaction.atomic():
+        jobs = list(
+            queryset.select_for_update(skip_locked=True, of=("self",))
+            .select_related("mailing__message", "mailing__owner", "recipient")
+            .order_by("id")[:batch_size]
+        )
+        OutboxJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status="processing", locked_at=now, claim_token=token
+        )
+    for job in jobs:
+        job.status, job.locked_at, job.claim_token = "processing", now, token
+    return jobs
+
+
+def claimed(jobs):
+    """Задания, которые всё ещё числятся за пачкой, забравшей jobs."""
+    if not jobs:
+        return OutboxJob.objects.none()
+    return OutboxJob.objects.filter(
+        id__in=[job.id for job in jobs],
+        status="processing",
+        claim_token=jobs[0].claim_token,
+    )
+
+
+def finish_mailings(mailing_ids):
+    """Завершает рассылки, у которых не осталось заданий в очереди.
+
+    Задания, ожидающие повтора, остаются в статусе "pending", поэтому такие
+    рассылки не завершаются до исчерпания повторов.
+    """
+    for mailing_id in mailing_ids:
+        jobs = OutboxJob.objects.filter(mailing_id=mailing_id)
+        if jobs.filter(status__in=["pending", "processing"]).exists():
+            continue
+        # Рассылку могут завершать несколько воркеров сразу: счётчики меняет
+        # только тот, чей UPDATE действительно перевёл её из "started"
+        started = Mailing.objects.filter(id=mailing_id, status="started")
+        owner_id = started.values_list("owner_id", flat=True).first()
+        if started.update(status="completed") == 1:
+            adjust_counters(owner_id, active_mailings=-1)
+            invalidate_user_cache(owner_id)
+
+
+def retry_failed_jobs(jobs):
+    """Возвращает упавшие задания одной пачки в очередь с экспоненциальной паузой.
+
+    После MAILING_MAX_RETRIES повторов задание помечается как "failed".
+    Возвращает Counter {ID рассылки: сколько заданий помечено как "failed"}.
+    """
+    max_retries = getattr(settings, "MAILING_MAX_RETRIES", 5)
+    now = timezone.now()
+    by_retries = defaultdict(list)
+    for job in jobs:
+        by_retries[job.retries].append(job)
+
+    exhausted = Counter()
+    for retries, group in by_retries.items():
+        queryset = claimed(group)
+        if retries >= max_retries:
+            if queryset.update(status="failed", locked_at=None):
+                exhausted.update(job.mailing_id for job in group)
+        else:
+            queryset.update(
+                status="pending",
+                locked_at=None,
+                retries=F("retries") + 1,
+                next_attempt_at=now + get_retry_delay(retries + 1),
+            )
+    return exhausted
+
+
+def process_outbox(batch_size=None, concurrency=None, mailing_id=None, pool=None):
+    """Отправляет одну пачку заданий из очереди, возвращает счётчики.
+
+    Статусы заданий меняются в одной транзакции с записью каждой пачки
+    попыток, а не после всей пачки заданий, поэтому после сбоя воркера
+    отправленные письма не уходят повторно. Пачка попыток записывается не
+    реже чем через десятую часть MAILING_OUTBOX_LOCK_TIMEOUT, и при этом
+    продлевается блокировка ещё не отправленных заданий. Через половину
+    MAILING_OUTBOX_LOCK_TIMEOUT новые письма больше не отправляются, а
+    оставшиеся задания возвращаются в очередь.
+    """
+    batch_size = batch_size or getattr(settings, "MAILING_ATTEMPT_BATCH_SIZE", 500)
+    lock_timeout = getattr(settings, "MAILING_OUTBOX_LOCK_TIMEOUT", 600)
+    pool = pool or get_pool(concurrency)
+    jobs = claim_outbox_jobs(batch_size, mailing_id)
+    deadline = time.monotonic() + lock_timeout / 2
+
+    unfinished = {(job.mailing_id, job.recipient_id): job for job in jobs}
+    totals = Counter()
+
+    def save_outcomes(attempts):
+        sent_jobs, failed_jobs = [], []
+        for attempt in attempts:
+            job = unfinished.pop((attempt.mailing_id, attempt.recipient_id))
+            (sent_jobs if attempt.status == "success" else failed_jobs).append(job)
+        if claimed(sent_jobs).update(status="sent", locked_at=None) < len(sent_jobs):
+            logger.warning("Часть заданий пачки забрал другой воркер")
+        exhausted = retry_failed_jobs(failed_jobs)
+        claimed(list(unfinished.values())).update(locked_at=timezone.now())
+
+        # В прогресс идут только окончательные исходы: письмо отправлено или
+        # повторы исчерпаны. Задание, ожидающее повтора, ещё не завершено
+        sent = Counter(job.mailing_id for job in sent_jobs)
+        for mailing_id in sent.keys() | exhausted.keys():
+            record_progress(
+                mailing_id, sent=sent[mailing_id], failed=exhausted[mailing_id]
+            )
+        totals["success"] += len(sent_jobs)
+        totals["failed"] += len(failed_jobs)
+
+    def letters():
+        for job in jobs:
+            if time.monotonic() > deadline:
+                return
+            yield job, build_letter(job.mailing, job.recipient), job.mailing.owner_id
+
+    with AttemptBuffer(
+        flush_interval=lock_timeout / 10, on_flush=save_outcomes
+    ) as attempts:
+        for job, error in pool.run(letters()):
+            record_attempt(attempts, job.mailing, job.recipient, error)
+
+    # Не начатые до истечения времени задания возвращаются в очередь
+    claimed(list(unfinished.values())).update(
+        status="pending", locked_at=None, claim_token=None
+    )
+    finish_mailings({job.mailing_id for job in jobs})
+
+    return {
+        "total": totals["success"] + totals["failed"],
+        "success": totals["success"],
+        "failed": totals["failed"],
+    }
+
+
+def get_due_mailings(now=None):
+    """Рассылки, которые пора отправить.
+
+    Это рассылки в статусе "created", время первой отправки которых
+    наступило, и запущенные рассылки, у которых истекла пауза перед повтором
+    недоставленных писем (next_retry_at).
+    """
+    now = now or timezone.now()
+    return Mailing.objects.filter(
+        Q(status="created", first_datetime__lte=now)
+        | Q(status="started", next_retry_at__lte=now),
+        end_datetime__gt=now,
+    ).order_by("first_datetime")
+
+
+def stop_expired_mailings(now=None):
+    """Завершает рассылки, у которых прошло время окончания отправки.
+
+    Неотправленные задания таких рассылок удаляются из очереди.
+    Возвращает список ID остановленных рассылок.
+    """
+    now = now or timezone.now()
+    expired = list(
+        Mailing.objects.filter(
+            status__in=["created", "started"], end_datetime__lte=now
+        ).values_list("id", "owner_id", "status")
+    )
+    if expired:
+        mailing_ids = [mailing_id for mailing_id, _, _ in expired]
+        stopped_active = Counter(
+            owner_id for _, owner_id, status in expired if status == "started"
+        )
+        with transaction.atomic():
+            OutboxJob.objects.filter(
+                mailing_id__in=mailing_ids, status="pending"
+            ).delete()
+            Mailing.objects.filter(id__in=mailing_ids).update(
+                status="completed", next_retry_at=None
+            )
+            # update() не отправляет сигналы — поправляем счётчики и кэш сами
+            for owner_id, count in stopped_active.items():
+                adjust_counters(owner_id, active_mailings=-count)
+        invalidate_user_cache(*(owner_id for _, owner_id, _ in expired))
+        return mailing_ids
+    return []
+
+
+def get_next_schedule_time(now=None):
+    """Ближайший момент, когда планировщику снова будет что делать, или None."""
+    now = now or timezone.now()
+    # Каждый запрос — одно чтение по индексу (status, first/end_datetime
+    # или next_retry_at)
+    candidates = [
+        Mailing.objects.filter(status="created", first_datetime__gt=now)
+        .order_by("first_datetime")
+        .values_list("first_datetime", flat=True)
+        .first(),
+        Mailing.objects.filter(status="started", next_retry_at__gt=now)
+        .order_by("next_retry_at")
+        .values_list("next_retry_at", flat=True)
+        .first(),
+    ]
+    for status in ("created", "started"):
+        candidates.append(
+            Mailing.objects.filter(status=status, end_datetime__gt=now)
+            .order_by("end_datetime")
+            .values_list("end_datetime", flat=True)
+            .first()
+        )
+    return min((time for time in candidates if time), default=None)
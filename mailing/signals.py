@@ -0,0 +1,68 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import invalidate_user_cache
+from .counters import adjust_counters
+from .models import Mailing, MailingAttempt, Message, Recipient
+
+
+@receiver(post_save, sender=Recipient)
+@receiver(post_delete, sender=Recipient)
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+@receiver(post_save, sender=Mailing)
+@receiver(post_delete, sender=Mailing)
+@receiver(post_save, sender=MailingAttempt)
+@receiver(post_delete, sender=MailingAttempt)
+def invalidate_owner_cache(sender, instance, **kwargs):
+    invalidate_user_cache(instance.owner_id)
+
+
+@receiver(m2m_changed, sender=Mailing.recipients.through)
+def invalidate_mailing_recipients_cache(sender, instance, **kwargs):
+    invalidate_user_cache(instance.owner_id)
+
+
+# Счётчики главной страницы
+
+
+@receiver(post_save, sender=Recipient)
+def count_created_recipient(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters(instance.owner_id, recipients=1)
+
+
+# При удалении счётчики только уменьшаются и никогда не пересчитываются:
+# при удалении пользователя его строка DashboardCounters удаляется каскадом
+# раньше получателей и рассылок, и пересчёт создал бы её заново.
+
+
+@receiver(post_delete, sender=Recipient)
+def count_deleted_recipient(sender, instance, **kwargs):
+    adjust_counters(instance.owner_id, rebuild_missing=False, recipients=-1)
+
+
+@receiver(post_save, sender=Mailing)
+def count_saved_mailing(sender, instance, created, update_fields, **kwargs):
+    # Прежний статус запомнен при загрузке объекта (Mailing.from_db)
+    if update_fields is None or "status" in update_fields:
+        was_active = instance._loaded_status == "started"
+        is_active = instance.status == "started"
+        instance._loaded_status = instance.status
+    else:
+        was_active = is_active = False
+    adjust_counters(
+        instance.owner_id,
+        total_mailings=1 if created else 0,
+        active_mailings=int(is_active) - int(was_active),
+    )
+
+
+@receiver(post_delete, sender=Mailing)
+def count_deleted_mailing(sender, instance, **kwargs):
+    adjust_counters(
+        instance.owner_id,
+        rebuild_missing=False,
+        total_mailings=-1,
+        active_mailings=-1 if instance.status == "started" else 0,
+    )
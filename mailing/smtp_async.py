@@ -0,0 +1,200 @@
+import asyncio
+import base64
+import re
+import smtplib
+import ssl
+
+from django.conf import settings
+from django.core.mail.message import sanitize_address
+from django.core.mail.utils import DNS_NAME
+
+
+CRLF = b"\r\n"
+
+
+class AsyncSMTPSession:
+    """Минимальный асинхронный SMTP-клиент на asyncio из стандартной библиотеки.
+
+    Параметры подключения по умолчанию берутся из настроек EMAIL_*, как у
+    стандартного SMTP-бэкенда Django. Если сервер объявляет PIPELINING,
+    команды MAIL FROM / RCPT TO / DATA отправляются одним пакетом.
+    Соединение открывается лениво и переоткрывается после обрыва или после
+    MAILING_MESSAGES_PER_CONNECTION писем.
+    """
+
+    def __init__(
+        self,
+        host=None,
+        port=None,
+        username=None,
+        password=None,
+        use_tls=None,
+        use_ssl=None,
+        timeout=None,
+        max_messages=None,
+    ):
+        self.host = host or settings.EMAIL_HOST
+        self.port = port or settings.EMAIL_PORT
+        self.username = settings.EMAIL_HOST_USER if username is None else username
+        self.password = settings.EMAIL_HOST_PASSWORD if password is None else password
+        self.use_tls = settings.EMAIL_USE_TLS if use_tls is None else use_tls
+        self.use_ssl = settings.EMAIL_USE_SSL if use_ssl is None else use_ssl
+        self.timeout = settings.EMAIL_TIMEOUT if timeout is None else timeout
+        self.max_messages = max_messages or getattr(
+            settings, "MAILING_MESSAGES_PER_CONNECTION", 100
+        )
+        self.reader = None
+        self.writer = None
+        self.features = set()
+        self.sent = 0
+
+    async def read_reply(self):
+        lines = []
+        while True:
+            line = await self.wait(self.reader.readline())
+            if not line:
+                raise smtplib.SMTPServerDisconnected("Соединение закрыто сервером")
+            lines.append(line[4:].strip().decode("utf-8", "replace"))
+            if line[3:4] != b"-":
+                return int(line[:3]), "\n".join(lines)
+
+    async def wait(self, awaitable):
+        if self.timeout is None:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, self.timeout)
+
+    async def write(self, *lines):
+        self.writer.write(b"".join(line.encode() + CRLF for line in lines))
+        await self.wait(self.writer.drain())
+
+    async def expect(self, *codes):
+        code, text = await self.read_reply()
+        if code not in codes:
+            raise smtplib.SMTPResponseException(code, text)
+        return code, text
+
+    async def command(self, line, *codes):
+        await self.write(line)
+        return await self.expect(*codes)
+
+    async def ehlo(self):
+        _, text = await self.command(f"EHLO {DNS_NAME.get_fqdn()}", 250)
+        self.features = {
+            line.split()[0].lower() for line in text.splitlines()[1:] if line
+        }
+
+    async def connect(self):
+        ssl_context = ssl.create_default_context() if self.use_ssl else None
+        self.reader, self.writer = await self.wait(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context)
+        )
+        await self.expect(220)
+        await self.ehlo()
+
+        if self.use_tls:
+            await self.command("STARTTLS", 220)
+            await self.writer.start_tls(ssl.create_default_context())
+            await self.ehlo()
+
+        if self.username and self.password:
+            token = base64.b64encode(
+                f"\0{self.username}\0{self.password}".encode()
+            ).decode()
+            await self.command(f"AUTH PLAIN {token}", 235)
+
+        self.sent = 0
+
+    async def close(self):
+        if self.writer is None:
+            return
+        try:
+            await self.command("QUIT", 221)
+        except Exception:
+            pass
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+        self.reader = self.writer = None
+
+    async def reconnect(self):
+        await self.close()
+        await self.connect()
+
+    async def sendmail(self, from_email, recipients, data):
+        data = re.sub(rb"(?m)^\.", b"..", data)
+        if not data.endswith(CRLF):
+            data += CRLF
+
+        commands = [f"MAIL FROM:<{from_email}>"]
+        commands += [f"RCPT TO:<{recipient}>" for recipient in recipients]
+        commands.append("DATA")
+
+        try:
+            if "pipelining" in self.features:
+                await self.write(*commands)
+                replies = [await self.read_reply() for _ in commands]
+            else:
+                replies = []
+                for line in commands:
+                    if line == "DATA" and all(
+                        reply[0] not in (250, 251) for reply in replies[1:]
+                    ):
+                        break
+                    await self.write(line)
+                    replies.append(await self.read_reply())
+                    if replies[0][0] != 250:
+                        break
+
+            mail_reply, *rcpt_replies = replies[: len(recipients) + 1]
+            if mail_reply[0] != 250:
+                raise smtplib.SMTPSenderRefused(*mail_reply, from_email)
+            refused = {
+                recipient: reply
+                for recipient, reply in zip(recipients, rcpt_replies)
+                if reply[0] not in (250, 251)
+            }
+            if len(refused) == len(recipients):
+                if replies[-1][0] == 354:
+                    # Сервер принял DATA без получателей — закрываем пустое письмо
+                    await self.command(".", 250, 554)
+                raise smtplib.SMTPRecipientsRefused(refused)
+            if replies[-1][0] != 354:
+                raise smtplib.SMTPDataError(*replies[-1])
+
+            self.writer.write(data + b"." + CRLF)
+            await self.wait(self.writer.drain())
+            code, text = await self.read_reply()
+            if code != 250:
+                raise smtplib.SMTPDataError(code, text)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            await self.reset()
+            raise
+
+    async def reset(self):
+        try:
+            await self.command("RSET", 250)
+        except Exception:
+            # Сессия в неизвестном состоянии — при следующей отправке откроем новую
+            await self.close()
+
+    async def send(self, message):
+        if self.writer is None or self.sent >= self.max_messages:
+            await self.reconnect()
+
+        encoding = message.encoding or settings.DEFAULT_CHARSET
+        from_email = sanitize_address(message.from_email, encoding)
+        recipients = [
+            sanitize_address(address, encoding) for address in message.recipients()
+        ]
+        data = message.message().as_bytes(linesep="\r\n")
+
+        try:
+            await self.sendmail(from_email, recipients, data)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # Сервер закрыл соединение — переподключаемся и повторяем один раз
+            await self.reconnect()
+            await self.sendmail(from_email, recipients, data)
+
+        self.sent += 1
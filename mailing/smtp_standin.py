@@ -0,0 +1,103 @@
+import asyncio
+import multiprocessing
+
+
+# Локальный SMTP-сервер для bench_mailing и тестов: принимает письма и ничего
+# с ними не делает, а получателей, чей адрес начинается с "reject", отклоняет
+# кодом 550. Работает в отдельном процессе, чтобы не делить GIL с
+# измеряемой отправкой, поэтому модуль не импортирует Django.
+
+
+REJECT_PREFIX = b"reject"
+
+
+async def handle_session(reader, writer, latency):
+    writer.write(b"220 bench ESMTP\r\n")
+    accepted = 0
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line[:4].upper()
+            if command == b"EHLO":
+                writer.write(b"250-bench\r\n250-PIPELINING\r\n250 8BITMIME\r\n")
+            elif command in (b"MAIL", b"RSET"):
+                accepted = 0
+                writer.write(b"250 OK\r\n")
+            elif command == b"RCPT":
+                address = line.partition(b"<")[2].partition(b">")[0]
+                if address.lower().startswith(REJECT_PREFIX):
+                    writer.write(
+                        b"550 5.1.1 <" + address + b">: Recipient address rejected\r\n"
+                    )
+                else:
+                    accepted += 1
+                    writer.write(b"250 OK\r\n")
+            elif command == b"DATA" and not accepted:
+                writer.write(b"554 5.5.1 No valid recipients\r\n")
+            elif command == b"DATA":
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                await writer.drain()
+                while True:
+                    line = await reader.readline()
+                    if not line or line.rstrip(b"\r\n") == b".":
+                        break
+                if latency:
+                    # Имитация сервера, который долго принимает письмо
+                    await asyncio.sleep(latency)
+                writer.write(b"250 OK\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                # HELO, NOOP
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, latency, ports):
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_session(reader, writer, latency), host, 0
+    )
+    ports.put(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+def run_server(host, latency, ports):
+    asyncio.run(serve(host, latency, ports))
+
+
+class SMTPStandIn:
+    """Запускает сервер в дочернем процессе на свободном порту.
+
+    latency — пауза в секундах перед ответом на конец DATA.
+    """
+
+    def __init__(self, latency=0.0, host="127.0.0.1"):
+        self.latency = latency
+        self.host = host
+        self.port = None
+        self.process = None
+
+    def __enter__(self):
+        # spawn, а не fork: дочерний процесс не должен наследовать открытые
+        # соединения с БД
+        context = multiprocessing.get_context("spawn")
+        ports = context.Queue()
+        self.process = context.Process(
+            target=run_server, args=(self.host, self.latency, ports), daemon=True
+        )
+        self.process.start()
+        self.port = ports.get(timeout=30)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.join()
@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Mailing, MailingStatsHourly
+
+
+# Статистика рассылок хранится в почасовой сводной таблице, которую код
+# рассылки обновляет при записи попыток, поэтому страница статистики не
+# агрегирует таблицу MailingAttempt.
+
+
+def record_stats(attempts):
+    """Добавляет записанные попытки в почасовую статистику."""
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    totals = defaultdict(lambda: {"success_count": 0, "failed_count": 0})
+    for attempt in attempts:
+        field = "success_count" if attempt.status == "success" else "failed_count"
+        totals[(attempt.mailing_id, attempt.owner_id)][field] += 1
+
+    for (mailing_id, owner_id), counts in totals.items():
+        increments = {field: F(field) + value for field, value in counts.items()}
+        if MailingStatsHourly.objects.filter(mailing_id=mailing_id, hour=hour).update(
+            **increments
+        ):
+            continue
+        try:
+            with transaction.atomic():
+                MailingStatsHourly.objects.create(
+                    mailing_id=mailing_id, owner_id=owner_id, hour=hour, **counts
+                )
+        except IntegrityError:
+            # Строку за этот час успел создать другой процесс
+            MailingStatsHourly.objects.filter(mailing_id=mailing_id, hour=hour).update(
+                **increments
+            )
+
+
+def summarize(success, failed):
+    total = success + failed
+    return {
+        "total_attempts": total,
+        "successful_attempts": success,
+        "failed_attempts": failed,
+        "total_messages": success,
+        "success_rate": success * 100 / total if total else 0,
+    }
+
+
+def get_total_stats(queryset):
+    totals = queryset.aggregate(
+        success=Sum("success_count", default=0), failed=Sum("failed_count", default=0)
+    )
+    return summarize(totals["success"], totals["failed"])
+
+
+def get_mailing_stats(queryset):
+    """Статистика по рассылкам: одна строка на рассылку, сумма по часам."""
+    return (
+        queryset.values("mailing_id")
+        .annotate(success=Sum("success_count"), failed=Sum("failed_count"))
+        .order_by("-mailing_id")
+    )
+
+
+def describe_mailing_stats(rows):
+    """Дополняет строки get_mailing_stats объектами рассылок и процентами."""
+    rows = list(rows)
+    mailings = Mailing.objects.in_bulk([row["mailing_id"] for row in rows])
+    return [
+        {
+            "mailing": mailings.get(row["mailing_id"]),
+            **summarize(row["success"], row["failed"]),
+        }
+        for row in rows
+    ]
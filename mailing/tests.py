@@ -1,3 +1,1510 @@
-from django.test import TestCase
+import csv
+import email
+import gzip
+import io
+import json
+import os
+import shutil
+import smtplib
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from email import policy
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.core.paginator import EmptyPage
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import QuerySet
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from user.models import User
+from .counters import count_for_users, get_counters, rebuild_counters
+from .imports import import_recipients, upsert_recipients
+from .letters import LetterTemplate
+from .models import (
+    DashboardCounters,
+    Mailing,
+    MailingAttempt,
+    MailingStatsHourly,
+    Message,
+    OutboxJob,
+    Recipient,
+)
+from .metrics import (
+    CACHE_COUNTER,
+    HISTOGRAMS,
+    MetricsMiddleware,
+    RequestMetrics,
+    RequestStats,
+    registry,
+)
+from .pagination import (
+    ApproximateCountPaginator,
+    KeysetPage,
+    count_cache_key,
+    decode_cursor,
+    encode_cursor,
+)
+from .progress import get_progress, set_run_total, start_run
+from .query_plans import find_seq_scans, get_querysets
+from .ratelimit import RateLimiter, RedisRateLimiter, get_rate_limiter
+from .responses import describe_error, get_response_code, intern_response
+from .retention import AttemptArchive, archive_attempts
+from .services import (
+    ManagedConnection,
+    enqueue_mailing,
+    finish_mailings,
+    get_due_mailings,
+    get_next_schedule_time,
+    process_outbox,
+    start_mailing,
+)
+from .smtp_standin import SMTPStandIn
+from .stats import record_stats
+from .views import MailingAttemptListView
+
+
+# Кэш в памяти для тестов представлений: страницы, закэшированные в общем
+# Redis прошлыми прогонами, не должны попадать в ответы
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class MailingDataMixin:
+    def create_owner(self, email="owner@example.com"):
+        return User.objects.create_user(
+            email=email, username=email.split("@")[0], password="password"
+        )
+
+    def create_mailing(self, owner, recipients=3, title="Тема", letter="Текст"):
+        message = Message.objects.create(title=title, letter=letter, owner=owner)
+        now = timezone.now()
+        mailing = Mailing.objects.create(
+            first_datetime=now,
+            end_datetime=now + timedelta(days=1),
+            message=message,
+            owner=owner,
+        )
+        mailing.recipients.set(
+            [
+                Recipient.objects.create(
+                    email=f"r{number}-{owner.id}@example.com",
+                    full_name=f"Получатель {number}",
+                    owner=owner,
+                )
+                for number in range(recipients)
+            ]
+        )
+        return mailing
+
+
+class DashboardCountersTests(MailingDataMixin, TestCase):
+    def setUp(self):
+        self.owner = self.create_owner()
+        self.mailing = self.create_mailing(self.owner, recipients=3)
+
+    def assert_counters_match_tables(self):
+        (expected,) = count_for_users([self.owner.id])
+        counters = get_counters(self.owner)
+        self.assertEqual(
+            (counters.total_mailings, counters.active_mailings, counters.recipients),
+            (expected.total_mailings, expected.active_mailings, expected.recipients),
+        )
+
+    def test_status_changes_without_reading_previous_status(self):
+        get_counters(self.owner)
+        mailing = Mailing.objects.get(id=self.mailing.id)
+        mailing.status = "started"
+        with self.assertNumQueries(2):
+            # Сохранение рассылки и обновление счётчиков, без чтения статуса
+            mailing.save()
+        self.assert_counters_match_tables()
+
+        mailing.status = "completed"
+        mailing.save(update_fields=["status"])
+        self.assert_counters_match_tables()
+
+        Mailing.objects.filter(id=mailing.id).update(status="started")
+        mailing.refresh_from_db()
+        mailing.save()
+        self.assertEqual(get_counters(self.owner).active_mailings, 0)
+
+    def test_deletes_only_decrement_counters(self):
+        self.mailing.status = "started"
+        self.mailing.save()
+        get_counters(self.owner)
+
+        self.mailing.recipients.first().delete()
+        self.mailing.delete()
+        self.assert_counters_match_tables()
+
+    def test_deleting_owner_removes_counters(self):
+        self.mailing.status = "started"
+        self.mailing.save()
+        self.create_mailing(self.owner, recipients=0)
+        get_counters(self.owner)
+
+        self.owner.delete()
+
+        self.assertFalse(DashboardCounters.objects.exists())
+        self.assertFalse(Recipient.objects.exists())
+        self.assertFalse(Mailing.objects.exists())
+
+
+class RecipientDuplicatesTests(MailingDataMixin, TestCase):
+    def setUp(self):
+        self.owner = self.create_owner()
+        self.recipient = Recipient.objects.create(
+            email="Ivan@Example.com", full_name="Иван", owner=self.owner
+        )
+        self.client.force_login(self.owner)
+
+    def test_create_view_rejects_mixed_case_duplicate(self):
+        response = self.client.post(
+            reverse("recipient-create"),
+            {"email": " ivan@EXAMPLE.com", "full_name": "Дубликат"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("email", response.context["form"].errors)
+        self.assertEqual(Recipient.objects.count(), 1)
+
+    def test_other_owner_may_have_same_email(self):
+        other = self.create_owner("other@example.com")
+        recipient = Recipient(email="ivan@example.com", full_name="Иван", owner=other)
+        recipient.full_clean()
+
+    def test_upsert_updates_existing_recipient(self):
+        get_counters(self.owner)
+        created, existing = upsert_recipients(
+            self.owner,
+            [
+                {
+                    "email": "IVAN@example.com",
+                    "full_name": "Иван Петров",
+                    "comment": None,
+                },
+                {"email": "anna@example.com", "full_name": "Анна", "comment": "новая"},
+            ],
+        )
+
+        self.assertEqual((created, existing), (1, 1))
+        self.recipient.refresh_from_db()
+        self.assertEqual(self.recipient.full_name, "Иван Петров")
+        self.assertEqual(self.recipient.email, "IVAN@example.com")
+        self.assertEqual(get_counters(self.owner).recipients, 2)
+
+
+class RecipientImportTests(MailingDataMixin, TestCase):
+    CSV = (
+        "email,full_name,comment\n"
+        "anna@example.com,Анна,первая\n"
+        "ANNA@example.com,Анна повтор,\n"
+        "not-an-email,Плохой адрес,\n"
+        "boris@example.com,,\n"
+        "ivan@example.com,Иван Петров,\n"
+        "vera@example.com,Вера,\n"
+        "gleb@example.com,Глеб,\n"
+    )
+
+    def setUp(self):
+        self.owner = self.create_owner()
+        Recipient.objects.create(
+            email="Ivan@Example.com", full_name="Иван", owner=self.owner
+        )
+        get_counters(self.owner)
+
+    def run_import(self, text=None, **kwargs):
+        data = io.BytesIO((text or self.CSV).encode("utf-8"))
+        return import_recipients(self.owner, data, **kwargs)
+
+    def test_counts_accepted_duplicate_and_rejected_rows(self):
+        report = self.run_import()
+
+        self.assertEqual(
+            [report[key] for key in ("accepted", "updated", "duplicates", "rejected")],
+            [3, 0, 2, 2],
+        )
+        self.assertEqual(
+            report["errors"],
+            [
+                {"line": 4, "error": "Некорректный email"},
+                {"line": 5, "error": "Не указаны Ф.И.О."},
+            ],
+        )
+        self.assertEqual(
+            Recipient.objects.get(email="Ivan@Example.com").full_name, "Иван"
+        )
+        self.assertEqual(get_counters(self.owner).recipients, 4)
+
+    def test_batches_and_updates_existing_recipients(self):
+        with mock.patch(
+            "mailing.imports.upsert_recipients", wraps=upsert_recipients
+        ) as upsert:
+            report = self.run_import(batch_size=2, update_existing=True)
+
+        # Пачки: anna+ivan, vera+gleb (повторы и ошибки в пачку не попадают)
+        self.assertEqual(upsert.call_count, 2)
+        self.assertEqual(
+            [report[key] for key in ("accepted", "updated", "duplicates", "rejected")],
+            [3, 1, 1, 2],
+        )
+        self.assertEqual(
+            Recipient.objects.get(email_normalized="ivan@example.com").full_name,
+            "Иван Петров",
+        )
+        self.assertEqual(get_counters(self.owner).recipients, 4)
+        self.assertEqual(
+            Recipient.objects.filter(owner=self.owner).count(),
+            count_for_users([self.owner.id])[0].recipients,
+        )
+
+    def test_missing_email_column_is_an_error(self):
+        with self.assertRaisesMessage(ValidationError, "В файле нет колонки email"):
+            self.run_import("address,full_name\nanna@example.com,Анна\n")
+
+    def test_import_view_reports_counts_and_errors(self):
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            reverse("recipient-import"),
+            {"file": SimpleUploadedFile("recipients.csv", self.CSV.encode("utf-8"))},
+        )
+        self.assertEqual(response.context["report"]["accepted"], 3)
+
+        response = self.client.post(
+            reverse("recipient-import"),
+            {
+                "file": SimpleUploadedFile(
+                    "recipients.csv", "full_name\nАнна\n".encode("utf-8")
+                )
+            },
+        )
+        self.assertIn(
+            "В файле нет колонки email", response.context["form"].errors["file"]
+        )
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write(self.CSV)
+        self.addCleanup(os.remove, file.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+
+        call_command(
+            "import_recipients",
+            file.name,
+            owner=self.owner.email,
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+        self.assertIn(
+            "Добавлено: 3, обновлено: 0, дубликатов: 2, отклонено: 2", stdout.getvalue()
+        )
+        self.assertIn("Строка 4: Некорректный email", stderr.getvalue())
+        with self.assertRaisesMessage(CommandError, "не найден"):
+            call_command("import_recipients", file.name, owner="nobody@example.com")
+
+
+class MergeDuplicateRecipientsMigrationTests(TransactionTestCase):
+    migrate_from = [("mailing", "0010_recipient_email_normalized")]
+    migrate_to = [("mailing", "0011_merge_duplicate_recipients")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.migrate_from)
+        self.apps = self.executor.loader.project_state(self.migrate_from).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.migrate_to)
+        return self.executor.loader.project_state(self.migrate_to).apps
+
+    def test_duplicates_are_merged_into_first_recipient(self):
+        User = self.apps.get_model("user", "User")
+        Recipient = self.apps.get_model("mailing", "Recipient")
+        Message = self.apps.get_model("mailing", "Message")
+        Mailing = self.apps.get_model("mailing", "Mailing")
+        MailingAttempt = self.apps.get_model("mailing", "MailingAttempt")
+        OutboxJob = self.apps.get_model("mailing", "OutboxJob")
+        DashboardCounters = self.apps.get_model("mailing", "DashboardCounters")
+
+        owner = User.objects.create(email="owner@example.com", username="owner")
+        keep, duplicate, cyrillic, cyrillic_duplicate = [
+            Recipient.objects.create(email=email, full_name="Получатель", owner=owner)
+            for email in [
+                "ivan@example.com",
+                " IVAN@Example.com",
+                "Иван@пример.рф",
+                "иван@ПРИМЕР.рф",
+            ]
+        ]
+        message = Message.objects.create(title="Тема", letter="Текст", owner=owner)
+        now = timezone.now()
+        first, second = [
+            Mailing.objects.create(
+                first_datetime=now,
+                end_datetime=now + timedelta(days=1),
+                message=message,
+                owner=owner,
+            )
+            for _ in range(2)
+        ]
+        first.recipients.add(keep, duplicate)
+        second.recipients.add(duplicate)
+        attempt = MailingAttempt.objects.create(
+            status="success", mailing=second, recipient=duplicate, owner=owner
+        )
+        OutboxJob.objects.create(mailing=first, recipient=keep)
+        OutboxJob.objects.create(mailing=first, recipient=duplicate)
+        moved_job = OutboxJob.objects.create(mailing=second, recipient=duplicate)
+        DashboardCounters.objects.create(user_id=owner.id, recipients=4)
+
+        apps = self.migrate()
+        Recipient = apps.get_model("mailing", "Recipient")
+        Mailing = apps.get_model("mailing", "Mailing")
+        MailingAttempt = apps.get_model("mailing", "MailingAttempt")
+        OutboxJob = apps.get_model("mailing", "OutboxJob")
+        DashboardCounters = apps.get_model("mailing", "DashboardCounters")
+
+        self.assertEqual(
+            sorted(Recipient.objects.values_list("id", "email_normalized")),
+            [(keep.id, "ivan@example.com"), (cyrillic.id, "иван@пример.рф")],
+        )
+        self.assertFalse(Recipient.objects.filter(id=cyrillic_duplicate.id).exists())
+        for mailing in (first, second):
+            self.assertEqual(
+                list(
+                    Mailing.objects.get(id=mailing.id).recipients.values_list(
+                        "id", flat=True
+                    )
+                ),
+                [keep.id],
+            )
+        self.assertEqual(
+            MailingAttempt.objects.get(id=attempt.id).recipient_id, keep.id
+        )
+        self.assertEqual(
+            sorted(OutboxJob.objects.values_list("mailing_id", "recipient_id")),
+            [(first.id, keep.id), (second.id, keep.id)],
+        )
+        self.assertEqual(OutboxJob.objects.get(id=moved_job.id).recipient_id, keep.id)
+        self.assertEqual(DashboardCounters.objects.get(user_id=owner.id).recipients, 2)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class KeysetPaginationTests(MailingDataMixin, TestCase):
+    def setUp(self):
+        self.owner = self.create_owner()
+        self.mailing = self.create_mailing(self.owner, recipients=7)
+        self.other_mailing = self.create_mailing(self.owner, recipients=0)
+        self.other_mailing.recipients.set(self.mailing.recipients.all()[:2])
+        for mailing in (self.mailing, self.other_mailing):
+            MailingAttempt.objects.bulk_create(
+                MailingAttempt(
+                    status="success",
+                    mailing=mailing,
+                    recipient=recipient,
+                    owner=self.owner,
+                )
+                for recipient in mailing.recipients.all()
+            )
+        # Почти все попытки в одну и ту же секунду: порядок задаёт только id
+        moment = timezone.now().replace(microsecond=0)
+        MailingAttempt.objects.update(attempt_datetime=moment)
+        MailingAttempt.objects.filter(
+            id=MailingAttempt.objects.order_by("id").first().id
+        ).update(attempt_datetime=moment - timedelta(hours=1))
+        self.queryset = MailingAttempt.objects.filter(owner=self.owner)
+        self.expected = list(
+            self.queryset.order_by("-attempt_datetime", "-id").values_list(
+                "id", flat=True
+            )
+        )
+
+    def get_page(self, cursor=None):
+        return KeysetPage(self.queryset, 4, ("attempt_datetime", "id"), cursor)
+
+    def test_next_and_previous_cursors_with_equal_datetimes(self):
+        pages = [self.get_page()]
+        while pages[-1].has_next():
+            cursor = pages[-1].cursor_for("next", pages[-1].object_list[-1])
+            pages.append(self.get_page(cursor))
+
+        self.assertEqual(
+            [attempt.id for page in pages for attempt in page], self.expected
+        )
+        self.assertEqual([len(page) for page in pages], [4, 4, 1])
+        self.assertFalse(pages[0].has_previous())
+
+        previous = self.get_page(pages[2].cursor_for("prev", pages[2].object_list[0]))
+        self.assertEqual(
+            [attempt.id for attempt in previous], [attempt.id for attempt in pages[1]]
+        )
+        self.assertTrue(previous.has_next())
+        self.assertTrue(previous.has_previous())
+
+    @mock.patch.object(MailingAttemptListView, "paginate_by", 3)
+    def test_filters_survive_across_pages(self):
+        self.client.force_login(self.owner)
+        url = reverse("attempt-list")
+        response = self.client.get(url, {"mailing_id": self.mailing.id, "page": 3})
+        page = response.context["page_obj"]
+        self.assertIn(f"mailing_id={self.mailing.id}", page.next_query)
+        self.assertNotIn("page=", page.next_query)
+
+        response = self.client.get(f"{url}?{page.next_query}")
+        attempts = list(response.context["attempts"])
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(
+            {attempt.mailing_id for attempt in attempts}, {self.mailing.id}
+        )
+        self.assertIn(
+            f"mailing_id={self.mailing.id}", response.context["page_obj"].previous_query
+        )
+
+    def test_invalid_cursor_opens_first_page(self):
+        fields = [
+            MailingAttempt._meta.get_field(name) for name in ("attempt_datetime", "id")
+        ]
+        valid = encode_cursor("next", [timezone.now(), 1])
+        self.assertIsNotNone(decode_cursor(valid, fields))
+        for cursor in [
+            "не-base64",
+            valid[:-3],
+            encode_cursor("next", [1]),
+            encode_cursor("sideways", [timezone.now(), 1]),
+            encode_cursor("next", ["вчера", 1]),
+            encode_cursor("next", [timezone.now(), "один"]),
+        ]:
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor, fields))
+                page = self.get_page(cursor)
+                self.assertEqual([attempt.id for attempt in page], self.expected[:4])
+
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("attempt-list"), {"cursor": "%%%"})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(
+    CACHES=LOCAL_CACHES,
+    MAILING_APPROXIMATE_COUNT_THRESHOLD=3,
+    MAILING_COUNT_CACHE_TIMEOUT=300,
+)
+class ApproximateCountPaginatorTests(MailingDataMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = self.create_owner()
+        self.create_mailing(self.owner, recipients=4)
+
+    def paginate(self, per_page=2):
+        queryset = Recipient.objects.filter(owner=self.owner).order_by("id")
+        return ApproximateCountPaginator(queryset, per_page)
+
+    def add_recipient(self):
+        Recipient.objects.create(
+            owner=self.owner, email=f"extra-{uuid.uuid4().hex}@example.com"
+        )
+
+    def test_small_estimate_is_counted_exactly(self):
+        with mock.patch("mailing.pagination.estimate_count", return_value=2):
+            paginator = self.paginate()
+            self.assertEqual(paginator.count, 4)
+        self.assertFalse(paginator.is_approximate)
+        self.assertIsNone(cache.get(count_cache_key(paginator.object_list)))
+
+    def test_large_estimate_is_used_as_is(self):
+        with mock.patch("mailing.pagination.estimate_count", return_value=500):
+            paginator = self.paginate()
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 500)
+        self.assertTrue(paginator.is_approximate)
+        # Страница за пределами оценки — пустая, а не 404
+        self.assertEqual(paginator.validate_number(300), 300)
+
+    def test_count_is_cached_without_estimate(self):
+        paginator = self.paginate()
+        self.assertEqual(paginator.count, 4)
+        self.assertFalse(paginator.is_approximate)
+        self.assertEqual(cache.get(count_cache_key(paginator.object_list)), 4)
+
+        self.add_recipient()
+        paginator = self.paginate()
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 4)
+        self.assertTrue(paginator.is_approximate)
+        self.assertEqual(paginator.validate_number(3), 3)
+
+    def test_short_list_is_not_cached(self):
+        with override_settings(MAILING_APPROXIMATE_COUNT_THRESHOLD=10):
+            self.assertEqual(self.paginate().count, 4)
+            self.add_recipient()
+            paginator = self.paginate()
+            self.assertEqual(paginator.count, 5)
+        self.assertFalse(paginator.is_approximate)
+        with self.assertRaises(EmptyPage):
+            paginator.validate_number(4)
+
+    def test_falls_back_to_cached_count_when_explain_fails(self):
+        backend = mock.MagicMock(vendor="postgresql")
+        explain = mock.patch.object(
+            QuerySet, "explain", side_effect=DatabaseError("нет доступа")
+        )
+        with mock.patch(
+            "mailing.pagination.connections", {"default": backend}
+        ), explain as failing_explain:
+            paginator = self.paginate()
+            self.assertEqual(paginator.count, 4)
+        failing_explain.assert_called_once()
+        self.assertEqual(cache.get(count_cache_key(paginator.object_list)), 4)
+
+
+class AttemptExportTests(MailingDataMixin, TestCase):
+    def setUp(self):
+        self.owner = self.create_owner()
+        self.mailing = self.create_mailing(self.owner, recipients=2)
+        self.other_mailing = self.create_mailing(self.owner, recipients=0)
+        self.other_mailing.recipients.set(self.mailing.recipients.all()[:1])
+        stranger = self.create_owner("stranger@example.com")
+        foreign = self.create_mailing(stranger, recipients=1)
+
+        first, second = self.mailing.recipients.order_by("id")
+        rejected = intern_response("5.1.1 <адрес>: Recipient address rejected")
+        self.attempts = [
+            MailingAttempt.objects.create(
+                status=status,
+                mailing=mailing,
+                recipient=recipient,
+                owner=mailing.owner,
+                response_code=code,
+                response_id=response_id,
+            )
+            for status, mailing, recipient, code, response_id in [
+                ("success", self.mailing, first, 250, None),
+                ("failed", self.mailing, second, 550, rejected),
+                ("success", self.other_mailing, first, 250, None),
+                ("success", foreign, foreign.recipients.get(), 250, None),
+            ]
+        ]
+        MailingAttempt.objects.filter(id=self.attempts[0].id).update(
+            attempt_datetime=timezone.make_aware(datetime(2026, 1, 10, 12))
+        )
+        self.client.force_login(self.owner)
+
+    def export(self, **params):
+        response = self.client.get(reverse("attempt-export"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode("utf-8")
+        return list(csv.DictReader(io.StringIO(content)))
+
+    def test_exports_only_own_attempts_newest_first(self):
+        rows = self.export()
+
+        self.assertEqual(
+            [int(row["id"]) for row in rows],
+            [attempt.id for attempt in reversed(self.attempts[:3])],
+        )
+        failed = rows[1]
+        self.assertEqual(failed["status"], "failed")
+        self.assertEqual(failed["mailing_id"], str(self.mailing.id))
+        self.assertEqual(failed["recipient_email"], self.attempts[1].recipient.email)
+        self.assertEqual(failed["recipient_full_name"], "Получатель 1")
+        self.assertEqual(failed["owner_email"], self.owner.email)
+        self.assertEqual(failed["response_code"], "550")
+        self.assertEqual(
+            failed["server_response"], "5.1.1 <адрес>: Recipient address rejected"
+        )
+
+    def test_filters_apply(self):
+        def ids(**params):
+            return [int(row["id"]) for row in self.export(**params)]
+
+        first, second, third = [attempt.id for attempt in self.attempts[:3]]
+        self.assertEqual(ids(mailing_id=self.mailing.id), [second, first])
+        self.assertEqual(ids(status="failed"), [second])
+        self.assertEqual(ids(date_to="2026-01-10"), [first])
+        self.assertEqual(ids(date_from="2026-01-11"), [third, second])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in [
+            {"format": "xml"},
+            {"date_from": "10.01.2026"},
+            {"mailing_id": "x"},
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse("attempt-export"), params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_ndjson_format(self):
+        response = self.client.get(
+            reverse("attempt-export"), {"format": "ndjson", "status": "failed"}
+        )
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(
+            [json.loads(line)["id"] for line in lines], [self.attempts[1].id]
+        )
+
+
+class ArchiveAttemptsTests(MailingDataMixin, TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.owner = self.create_owner()
+        self.mailing = self.create_mailing(self.owner)
+        for recipient in self.mailing.recipients.all():
+            MailingAttempt.objects.create(
+                status="success",
+                mailing=self.mailing,
+                recipient=recipient,
+                owner=self.owner,
+            )
+        self.old = timezone.now() - timedelta(days=400)
+        MailingAttempt.objects.update(attempt_datetime=self.old)
+
+    def read_archives(self):
+        rows = []
+        for name in sorted(os.listdir(self.directory)):
+            self.assertTrue(name.endswith(".ndjson.gz"), name)
+            with gzip.open(os.path.join(self.directory, name), "rt") as file:
+                rows += [json.loads(line) for line in file]
+        return rows
+
+    def test_archives_and_deletes_old_attempts(self):
+        counts = archive_attempts(
+            timezone.now() - timedelta(days=30), self.directory, batch_size=2
+        )
+
+        self.assertEqual(counts, {f"{self.old:%Y-%m}": 3})
+        self.assertFalse(MailingAttempt.objects.exists())
+        rows = self.read_archives()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(
+            {row["recipient__email"] for row in rows},
+            {recipient.email for recipient in self.mailing.recipients.all()},
+        )
+
+    def test_failed_run_keeps_attempts_and_earlier_archives(self):
+        before = timezone.now() - timedelta(days=30)
+        archive_attempts(before, self.directory)
+        MailingAttempt.objects.create(
+            status="success", mailing=self.mailing, owner=self.owner
+        )
+        MailingAttempt.objects.update(attempt_datetime=self.old)
+
+        with mock.patch.object(AttemptArchive, "commit", side_effect=OSError):
+            with self.assertRaises(OSError):
+                archive_attempts(before, self.directory)
+
+        # Временные файлы удалены, старые архивы читаются, попытка на месте
+        self.assertEqual(len(self.read_archives()), 3)
+        self.assertEqual(MailingAttempt.objects.count(), 1)
+        archive_attempts(before, self.directory)
+        self.assertEqual(len(self.read_archives()), 4)
+        self.assertFalse(MailingAttempt.objects.exists())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class MailingStatsTests(MailingDataMixin, TestCase):
+    def setUp(self):
+        self.owner = self.create_owner()
+        self.mailing = self.create_mailing(self.owner, recipients=0)
+        self.stranger = self.create_owner("stranger@example.com")
+        self.foreign = self.create_mailing(self.stranger, recipients=0)
+
+    def attempts(self, mailing, success=0, failed=0):
+        return [
+            MailingAttempt(status=status, mailing=mailing, owner=mailing.owner)
+            for status in ["success"] * success + ["failed"] * failed
+        ]
+
+    def at(self, hour):
+        moment = timezone.make_aware(datetime(2026, 3, 1, hour, 25))
+        return mock.patch("mailing.stats.timezone.now", return_value=moment)
+
+    def rows(self):
+        return list(
+            MailingStatsHourly.objects.order_by("mailing_id", "hour").values_list(
+                "mailing_id", "owner_id", "hour__hour", "success_count", "failed_count"
+            )
+        )
+
+    def grant(self, user, *codenames):
+        user.user_permissions.add(
+            *Permission.objects.filter(
+                content_type__app_label="mailing", codename__in=codenames
+            )
+        )
+
+    def test_rollup_adds_to_the_same_hour(self):
+        with self.at(10):
+            record_stats(
+                self.attempts(self.mailing, success=2, failed=1)
+                + self.attempts(self.foreign, failed=1)
+            )
+            record_stats(self.attempts(self.mailing, success=1, failed=1))
+        with self.at(11):
+            record_stats(self.attempts(self.mailing, success=1))
+
+        self.assertEqual(
+            self.rows(),
+            [
+                (self.mailing.id, self.owner.id, 10, 3, 2),
+                (self.mailing.id, self.owner.id, 11, 1, 0),
+                (self.foreign.id, self.stranger.id, 10, 0, 1),
+            ],
+        )
+
+    def test_rollup_survives_concurrent_insert_of_the_hour(self):
+        filter_stats = MailingStatsHourly.objects.filter
+        calls = []
+
+        def stale_first(**kwargs):
+            # Первое обновление не видит строку, созданную другим процессом
+            calls.append(kwargs)
+            if len(calls) == 1:
+                return MailingStatsHourly.objects.none()
+            return filter_stats(**kwargs)
+
+        with self.at(10):
+            record_stats(self.attempts(self.mailing, success=1))
+            with mock.patch.object(
+                MailingStatsHourly.objects, "filter", side_effect=stale_first
+            ):
+                record_stats(self.attempts(self.mailing, success=1, failed=2))
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.rows(), [(self.mailing.id, self.owner.id, 10, 2, 2)])
+
+    def test_view_shows_only_own_stats(self):
+        with self.at(10):
+            record_stats(self.attempts(self.mailing, success=3, failed=1))
+            record_stats(self.attempts(self.foreign, failed=5))
+        self.grant(self.owner, "view_mailing_stats")
+        self.client.force_login(self.owner)
+
+        response = self.client.get(reverse("mailing-stats"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row["mailing"] for row in response.context["user_stats"]], [self.mailing]
+        )
+        total = response.context["total_stats"]
+        self.assertEqual(
+            (total["total_attempts"], total["failed_attempts"], total["success_rate"]),
+            (4, 1, 75),
+        )
+
+    def test_view_requires_permission(self):
+        self.client.force_login(self.stranger)
+        response = self.client.get(reverse("mailing-stats"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_moderator_sees_all_stats(self):
+        with self.at(10):
+            record_stats(self.attempts(self.mailing, success=1))
+            record_stats(self.attempts(self.foreign, failed=1))
+        moderator = self.create_owner("moderator@example.com")
+        self.grant(moderator, "view_mailing_stats", "view_all_mailings")
+        self.client.force_login(moderator)
+
+        response = self.client.get(reverse("mailing-stats"))
+
+        self.assertEqual(
+            [row["mailing"] for row in response.context["user_stats"]],
+            [self.foreign, self.mailing],
+        )
+        self.assertEqual(response.context["total_stats"]["total_attempts"], 2)
+
+
+class LetterTemplateTests(SimpleTestCase):
+    def parse(self, letter):
+        return email.message_from_bytes(
+            letter.message().as_bytes(linesep="\r\n"), policy=policy.default
+        )
+
+    def assert_same_letter(self, prepared, expected):
+        prepared, expected = self.parse(prepared), self.parse(expected)
+        for name in ("Subject", "From", "To", "Content-Transfer-Encoding"):
+            self.assertEqual(prepared[name], expected[name], name)
+        self.assertEqual(prepared.get_content_charset(), expected.get_content_charset())
+        self.assertEqual(prepared.get_content(), expected.get_content())
+        self.assertTrue(prepared["Date"] and prepared["Message-ID"])
+
+    def test_matches_email_message(self):
+        recipient = Recipient(email="user@example.com", full_name="Иван Петров")
+        for subject, body in [
+            ("Plain subject", "Plain body\n"),
+            ("Тема письма", "Текст письма\nвторая строка"),
+            (
+                "Очень длинная тема письма рассылки, которая не помещается "
+                "в одну строку заголовка и кодируется несколькими частями",
+                "Текст\n" * 20,
+            ),
+        ]:
+            with self.subTest(subject=subject):
+                prepared = LetterTemplate(subject, body).for_recipient(recipient)
+                expected = EmailMessage(
+                    subject=subject,
+                    body=body,
+                    from_email=prepared.from_email,
+                    to=[recipient.email],
+                )
+                self.assert_same_letter(prepared, expected)
+
+    def test_substitutes_recipient_in_subject_and_body(self):
+        recipient = Recipient(email="ivan@example.com", full_name="Иван Петров")
+        template = LetterTemplate(
+            "{{ full_name }}, новости {x}",
+            "Здравствуйте, {{full_name}}!\nПисьмо для {{ email }}. {{ unknown }}",
+        )
+        prepared = template.for_recipient(recipient)
+        expected = EmailMessage(
+            subject="Иван Петров, новости {x}",
+            body="Здравствуйте, Иван Петров!\nПисьмо для ivan@example.com. {{ unknown }}",
+            from_email=prepared.from_email,
+            to=[recipient.email],
+        )
+        self.assert_same_letter(prepared, expected)
+
+        other = template.for_recipient(Recipient(email="anna@example.com"))
+        self.assertEqual(self.parse(other)["Subject"], ", новости {x}")
+        self.assertIn("Письмо для anna@example.com.", self.parse(other).get_content())
+
+    def test_long_lines_after_substitution_use_email_message(self):
+        recipient = Recipient(email="ivan@example.com", full_name="Иван " * 250)
+        letter = LetterTemplate("Тема", "{{ full_name }}").for_recipient(recipient)
+        self.assertIsInstance(letter, EmailMessage)
+        self.assertEqual(letter.body, recipient.full_name)
+
+    def test_message_rejects_unknown_placeholders(self):
+        message = Message(title="{{ name }}", letter="{{ full_name }} {{ phone }}")
+        with self.assertRaises(ValidationError) as context:
+            message.clean()
+        errors = context.exception.message_dict
+        self.assertIn("Неизвестные подстановки: name.", errors["title"][0])
+        self.assertIn("Неизвестные подстановки: phone.", errors["letter"][0])
+
+        Message(title="{{ full_name }}", letter="{{email}}").clean()
+
+
+class RecordingBackend(BaseEmailBackend):
+    """Почтовый бэкенд, запоминающий открытые соединения и отправленные письма.
+
+    Если drop_next выставлен, очередная отправка падает, как при обрыве
+    соединения сервером. Адреса, начинающиеся с "reject", отклоняются.
+    """
+
+    connections = []
+    drop_next = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.opened = self.closed = False
+        self.sent = []
+        RecordingBackend.connections.append(self)
+
+    def open(self):
+        self.opened = True
+
+    def close(self):
+        self.closed = True
+
+    def send_messages(self, email_messages):
+        if RecordingBackend.drop_next:
+            RecordingBackend.drop_next = False
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        for message in email_messages:
+            refused = {
+                address: (550, b"5.1.1 Recipient address rejected")
+                for address in message.recipients()
+                if address.startswith("reject")
+            }
+            if refused:
+                raise smtplib.SMTPRecipientsRefused(refused)
+        self.sent += email_messages
+        return len(email_messages)
+
+
+class ManagedConnectionTests(SimpleTestCase):
+    options = {"backend": "mailing.tests.RecordingBackend"}
+
+    def setUp(self):
+        RecordingBackend.connections = []
+        RecordingBackend.drop_next = False
+
+    def send(self, connection, count):
+        for number in range(count):
+            connection.send(
+                EmailMessage("Тема", "Текст", to=[f"r{number}@example.com"])
+            )
+
+    def test_reuses_connection_until_message_limit(self):
+        with ManagedConnection(
+            max_messages=2, connection_options=self.options
+        ) as connection:
+            self.send(connection, 5)
+
+        self.assertEqual(
+            [len(backend.sent) for backend in RecordingBackend.connections], [2, 2, 1]
+        )
+        self.assertTrue(all(backend.closed for backend in RecordingBackend.connections))
+
+    def test_reconnects_after_drop_and_resends(self):
+        with ManagedConnection(
+            max_messages=10, connection_options=self.options
+        ) as connection:
+            self.send(connection, 2)
+            RecordingBackend.drop_next = True
+            self.send(connection, 2)
+
+        first, second = RecordingBackend.connections
+        self.assertTrue(first.closed)
+        self.assertEqual(len(first.sent), 2)
+        self.assertEqual(
+            [message.to for message in second.sent],
+            [["r0@example.com"], ["r1@example.com"]],
+        )
+
+
+class ServerResponseTests(TestCase):
+    def refused(self, email):
+        return smtplib.SMTPRecipientsRefused(
+            {email: (550, f"5.1.1 <{email}>: Recipient address rejected".encode())}
+        )
+
+    def test_same_refusal_for_different_recipients_is_stored_once(self):
+        first = self.refused("first@example.com")
+        second = self.refused("Second.User+tag@mail.example.org")
+
+        self.assertEqual(
+            describe_error(first), "5.1.1 <адрес>: Recipient address rejected"
+        )
+        self.assertEqual(describe_error(first), describe_error(second))
+        self.assertEqual(get_response_code(second), 550)
+        self.assertEqual(
+            intern_response(describe_error(first)),
+            intern_response(describe_error(second)),
+        )
+
+    def test_describes_response_and_connection_errors(self):
+        self.assertEqual(
+            describe_error(
+                smtplib.SMTPDataError(554, b"Message from <a@b.ru> rejected as spam")
+            ),
+            "Message from <адрес> rejected as spam",
+        )
+        self.assertEqual(
+            describe_error(ConnectionRefusedError(111, "Connection refused")),
+            "[Errno 111] Connection refused",
+        )
+
+
+class StartMailingStandInTests(MailingDataMixin, TestCase):
+    """Отправка рассылки целиком через локальный SMTP-сервер (SMTPStandIn)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = SMTPStandIn()
+        cls.server.__enter__()
+        cls.addClassCleanup(cls.server.__exit__, None, None, None)
+
+    def setUp(self):
+        settings = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST=self.server.host,
+            EMAIL_PORT=self.server.port,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+            EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.owner = self.create_owner()
+        self.mailing = self.create_mailing(self.owner, recipients=4)
+        self.rejected = self.mailing.recipients.order_by("id").first()
+        self.rejected.email = "reject@example.com"
+        self.rejected.save()
+
+    def assert_delivered(self, result):
+        self.assertEqual(
+            result,
+            {
+                "total": 4,
+                "success": 3,
+                "failed": 1,
+                "all_successful": False,
+                "status": "started",
+                "message": "Рассылка завершена с ошибками",
+            },
+        )
+        attempts = MailingAttempt.objects.filter(mailing=self.mailing)
+        self.assertEqual(attempts.filter(status="success").count(), 3)
+        self.assertEqual(
+            set(
+                attempts.filter(status="success").values_list(
+                    "response_code", flat=True
+                )
+            ),
+            {250},
+        )
+        failed = attempts.get(status="failed")
+        self.assertEqual(failed.recipient, self.rejected)
+        self.assertEqual(failed.response_code, 550)
+
+    def test_async_delivery(self):
+        self.assert_delivered(
+            start_mailing(self.mailing.id, concurrency=2, use_async=True)
+        )
+
+    def test_thread_pool_delivery(self):
+        self.assert_delivered(start_mailing(self.mailing.id, concurrency=2))
+
+    def test_rerun_sends_only_undelivered(self):
+        start_mailing(self.mailing.id, use_async=True)
+        MailingAttempt.objects.filter(status="failed").update(
+            attempt_datetime=timezone.now() - timedelta(days=1)
+        )
+        result = start_mailing(self.mailing.id, use_async=True)
+        self.assertEqual((result["total"], result["failed"]), (1, 1))
+
+
+@override_settings(
+    MAILING_METRICS_ENABLED=True,
+    CACHES=LOCAL_CACHES,
+)
+class CacheMetricsTests(MailingDataMixin, TestCase):
+    def get_lookups(self):
+        return [
+            registry.cache_lookups.get(("recipient-list", result), 0)
+            for result in ("hit", "miss")
+        ]
+
+    def test_page_cache_counts_only_page_lookups(self):
+        owner = self.create_owner()
+        self.client.force_login(owner)
+        before = self.get_lookups()
+
+        self.client.get(reverse("recipient-list"))
+        self.client.get(reverse("recipient-list"))
+
+        # Промах и попадание самой страницы; чтение версии не считается
+        hits, misses = [now - was for now, was in zip(self.get_lookups(), before)]
+        self.assertEqual((hits, misses), (1, 1))
+
+
+@override_settings(
+    MAILING_METRICS_ENABLED=True,
+    MAILING_METRICS_TOKEN="secret-token",
+    CACHES=LOCAL_CACHES,
+)
+class MetricsViewTests(MailingDataMixin, TestCase):
+    def get_metrics(self, **headers):
+        return self.client.get(reverse("metrics"), headers=headers)
+
+    def test_access_requires_superuser_or_token(self):
+        self.assertEqual(self.get_metrics().status_code, 403)
+        self.assertEqual(
+            self.get_metrics(authorization="Bearer wrong").status_code, 403
+        )
+        self.client.force_login(self.create_owner())
+        self.assertEqual(self.get_metrics().status_code, 403)
+
+        response = self.get_metrics(authorization="Bearer secret-token")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8"
+        )
+
+        admin = User.objects.create_superuser(
+            email="admin@example.com", username="admin", password="password"
+        )
+        self.client.force_login(admin)
+        self.assertEqual(self.get_metrics().status_code, 200)
+
+    @override_settings(MAILING_METRICS_TOKEN="")
+    def test_empty_token_is_not_accepted(self):
+        self.assertEqual(self.get_metrics(authorization="Bearer ").status_code, 403)
+
+    def test_exposition_format(self):
+        self.client.force_login(self.create_owner())
+        self.client.get(reverse("recipient-list"))
+
+        text = self.get_metrics(authorization="Bearer secret-token").content.decode()
+        lines = text.splitlines()
+        self.assertTrue(text.endswith("\n"))
+        for name in HISTOGRAMS:
+            self.assertIn(f"# TYPE {name} histogram", lines)
+            buckets = [
+                line
+                for line in lines
+                if line.startswith(f'{name}_bucket{{view="recipient-list",')
+            ]
+            counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+            self.assertEqual(len(buckets), len(HISTOGRAMS[name][1]) + 1)
+            self.assertTrue(
+                buckets[-1].startswith(
+                    f'{name}_bucket{{view="recipient-list",le="+Inf"}}'
+                )
+            )
+            self.assertEqual(counts, sorted(counts))
+            self.assertIn(f'{name}_count{{view="recipient-list"}} {counts[-1]}', lines)
+            self.assertTrue(
+                any(
+                    line.startswith(f'{name}_sum{{view="recipient-list"}} ')
+                    for line in lines
+                )
+            )
+        self.assertIn(f"# TYPE {CACHE_COUNTER} counter", lines)
+        self.assertIn(
+            f'{CACHE_COUNTER}{{view="recipient-list",result="miss"}}',
+            text,
+        )
+
+    def test_render_of_known_values(self):
+        metrics = RequestMetrics()
+        stats = RequestStats()
+        stats.count, stats.duration, stats.cache_hits = 3, 0.02, 1
+        metrics.observe('say "hi"', 0.3, stats)
+
+        lines = metrics.render().splitlines()
+
+        self.assertIn(
+            'mailing_request_queries_bucket{view="say \\"hi\\"",le="2"} 0', lines
+        )
+        self.assertIn(
+            'mailing_request_queries_bucket{view="say \\"hi\\"",le="5"} 1', lines
+        )
+        self.assertIn(
+            'mailing_request_duration_seconds_bucket{view="say \\"hi\\"",le="+Inf"} 1',
+            lines,
+        )
+        self.assertIn('mailing_request_queries_sum{view="say \\"hi\\""} 3.0', lines)
+        self.assertIn(f'{CACHE_COUNTER}{{view="say \\"hi\\"",result="hit"}} 1', lines)
+        self.assertFalse(any('result="miss"' in line for line in lines))
+
+    @override_settings(MAILING_METRICS_ENABLED=False)
+    def test_disabled_metrics(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            MetricsMiddleware(lambda request: None)
+        admin = User.objects.create_superuser(
+            email="admin@example.com", username="admin", password="password"
+        )
+        self.client.force_login(admin)
+        self.assertEqual(self.get_metrics().status_code, 404)
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class MailingProgressTests(MailingDataMixin, TestCase):
+    def setUp(self):
+        self.owner = self.create_owner()
+        self.mailing = self.create_mailing(self.owner, recipients=3)
+        self.client.force_login(self.owner)
+
+    def test_counts_jobs_sent_right_after_enqueue(self):
+        def enqueue_and_deliver(mailing_id):
+            # Воркер забирает задания сразу после фиксации очереди
+            pending = enqueue_mailing(mailing_id)
+            process_outbox(mailing_id=mailing_id)
+            return pending
+
+        with mock.patch(
+            "mailing.views.enqueue_mailing", side_effect=enqueue_and_deliver
+        ):
+            response = self.client.post(
+                reverse("start-mailing", args=[self.mailing.id])
+            )
+        self.assertEqual(response.status_code, 202)
+
+        progress = self.client.get(response.json()["progress_url"]).json()
+        self.assertEqual(
+            (progress["total"], progress["sent"], progress["failed"]), (3, 3, 0)
+        )
+        self.assertTrue(progress["finished"])
+
+    @override_settings(
+        EMAIL_BACKEND="mailing.tests.RecordingBackend", MAILING_MAX_RETRIES=1
+    )
+    def test_retried_failures_are_not_counted_until_exhausted(self):
+        rejected = self.mailing.recipients.order_by("id").first()
+        rejected.email = "reject@example.com"
+        rejected.save()
+        job_id = start_run(self.mailing)
+        set_run_total(job_id, enqueue_mailing(self.mailing.id))
+
+        process_outbox(mailing_id=self.mailing.id)
+        progress = get_progress(job_id)
+        self.assertEqual((progress["sent"], progress["failed"]), (2, 0))
+        self.assertFalse(progress["finished"])
+
+        # Пауза перед повтором прошла, повтор тоже неудачен — попытки исчерпаны
+        OutboxJob.objects.filter(status="pending").update(next_attempt_at=None)
+        process_outbox(mailing_id=self.mailing.id)
+        progress = get_progress(job_id)
+        self.assertEqual((progress["sent"], progress["failed"]), (2, 1))
+        self.assertTrue(progress["finished"])
+
+
+class ScriptedPool:
+    """Пул отправки без писем: все письма «уходят», before(number) вызывается
+    перед каждым результатом."""
+
+    def __init__(self, before=None):
+        self.before = before
+
+    def run(self, letters):
+        for number, (job, message, owner_id) in enumerate(letters):
+            if self.before:
+                self.before(number)
+            yield job, None
+
+
+class OutboxWorkerTests(MailingDataMixin, TestCase):
+    def setUp(self):
+        self.owner = self.create_owner()
+        self.mailing = self.create_mailing(self.owner, recipients=3)
+        enqueue_mailing(self.mailing.id)
+
+    def get_statuses(self):
+        return list(OutboxJob.objects.order_by("id").values_list("status", flat=True))
+
+    def test_enqueue_skips_delivered_and_queued_recipients(self):
+        delivered = self.mailing.recipients.order_by("id").first()
+        OutboxJob.objects.all().delete()
+        MailingAttempt.objects.create(
+            status="success",
+            mailing=self.mailing,
+            recipient=delivered,
+            owner=self.owner,
+        )
+
+        self.assertEqual(enqueue_mailing(self.mailing.id), 2)
+        self.assertEqual(enqueue_mailing(self.mailing.id), 2)
+        self.assertFalse(OutboxJob.objects.filter(recipient=delivered).exists())
+        self.assertEqual(
+            set(OutboxJob.objects.values_list("status", "retries")), {("pending", 0)}
+        )
+
+    def test_enqueue_queries_do_not_depend_on_list_size(self):
+        large = self.create_mailing(
+            self.create_owner("large@example.com"), recipients=50
+        )
+        # Чтение рассылки, INSERT ... SELECT, обновления, подсчёт и точка сохранения
+        with self.assertNumQueries(8):
+            enqueue_mailing(large.id)
+        self.assertEqual(large.outbox_jobs.count(), 50)
+
+    @override_settings(MAILING_ATTEMPT_BATCH_SIZE=2)
+    def test_sent_jobs_are_saved_with_each_flush(self):
+        def crash(number):
+            if number == 2:
+                raise RuntimeError("воркер упал")
+
+        with self.assertRaises(RuntimeError):
+            process_outbox(batch_size=3, pool=ScriptedPool(crash))
+
+        # Первая пачка попыток записана вместе со статусами своих заданий
+        self.assertEqual(self.get_statuses(), ["sent", "sent", "processing"])
+        self.assertEqual(MailingAttempt.objects.count(), 2)
+
+    def test_reclaimed_jobs_keep_new_owner(self):
+        def reclaim(number):
+            if number == 0:
+                OutboxJob.objects.update(claim_token=uuid.uuid4())
+
+        process_outbox(pool=ScriptedPool(reclaim))
+
+        self.assertEqual(self.get_statuses(), ["processing"] * 3)
+
+    @override_settings(MAILING_OUTBOX_LOCK_TIMEOUT=0)
+    def test_jobs_not_started_in_time_return_to_queue(self):
+        result = process_outbox(pool=ScriptedPool())
+
+        self.assertEqual(result["total"], 0)
+        self.assertEqual(self.get_statuses(), ["pending"] * 3)
+        self.assertFalse(OutboxJob.objects.filter(claim_token__isnull=False).exists())
+
+    def test_mailing_is_completed_once_by_concurrent_workers(self):
+        OutboxJob.objects.update(status="sent")
+        Mailing.objects.filter(id=self.mailing.id).update(status="started")
+        rebuild_counters([self.owner.id])
+        check_queue = OutboxJob.objects.filter
+        other_worker_done = False
+
+        def other_worker_finishes_first(*args, **kwargs):
+            # Второй воркер завершает рассылку, пока первый проверяет очередь
+            nonlocal other_worker_done
+            if not other_worker_done:
+                other_worker_done = True
+                finish_mailings([self.mailing.id])
+            return check_queue(*args, **kwargs)
+
+        with mock.patch.object(
+            OutboxJob.objects, "filter", side_effect=other_worker_finishes_first
+        ):
+            finish_mailings([self.mailing.id])
+        finish_mailings([self.mailing.id])
+
+        self.assertEqual(Mailing.objects.get().status, "completed")
+        self.assertEqual(get_counters(self.owner).active_mailings, 0)
+
+
+@override_settings(
+    EMAIL_BACKEND="mailing.tests.RecordingBackend",
+    MAILING_MAX_RETRIES=2,
+    MAILING_RETRY_BACKOFF=60,
+)
+class SchedulerRetryTests(MailingDataMixin, TestCase):
+    def setUp(self):
+        self.owner = self.create_owner()
+        self.mailing = self.create_mailing(self.owner, recipients=2)
+        self.mailing.recipients.add(
+            Recipient.objects.create(email="reject@example.com", owner=self.owner)
+        )
+
+    def test_started_mailing_is_rerun_when_backoff_expires(self):
+        start_mailing(self.mailing.id)
+        self.mailing.refresh_from_db()
+        retry_at = self.mailing.next_retry_at
+        self.assertEqual(self.mailing.status, "started")
+        self.assertAlmostEqual((retry_at - timezone.now()).total_seconds(), 60, delta=5)
+
+        self.assertNotIn(self.mailing, get_due_mailings())
+        self.assertEqual(get_next_schedule_time(), retry_at)
+        self.assertIn(self.mailing, get_due_mailings(retry_at))
+
+        # Повтор по расписанию: снова падает, пауза удваивается
+        with mock.patch("mailing.services.timezone.now", return_value=retry_at):
+            start_mailing(self.mailing.id)
+        self.mailing.refresh_from_db()
+        self.assertAlmostEqual(
+            (self.mailing.next_retry_at - retry_at).total_seconds(), 120, delta=5
+        )
+
+    def test_completed_mailing_has_no_retry_time(self):
+        Recipient.objects.filter(email="reject@example.com").delete()
+        start_mailing(self.mailing.id)
+        self.mailing.refresh_from_db()
+        self.assertEqual(self.mailing.status, "completed")
+        self.assertIsNone(self.mailing.next_retry_at)
+        self.assertEqual(get_next_schedule_time(), None)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_paces_after_burst_per_domain(self):
+        limiter = RateLimiter({"domain": (10, 2)})
+        delays = [limiter.reserve(1, "a@example.com") for _ in range(3)]
+
+        self.assertEqual(delays[:2], [0, 0])
+        self.assertAlmostEqual(delays[2], 0.1, places=2)
+        self.assertEqual(limiter.reserve(1, "a@other.example"), 0)
+
+    def test_redis_limiter_reserves_all_buckets_in_one_call(self):
+        limiter = RedisRateLimiter(
+            {"global": (10, 20), "owner": None, "domain": (4, 1)},
+            "redis://localhost:6379/1",
+        )
+        with mock.patch.object(limiter, "script", return_value=250000) as script:
+            self.assertEqual(limiter.reserve(7, "user@Mail.Example"), 0.25)
+
+        script.assert_called_once_with(
+            keys=["mailing:ratelimit:global:", "mailing:ratelimit:domain:mail.example"],
+            args=[100000, 20, 250000, 1],
+        )
+
+    @mock.patch("mailing.ratelimit._limiter", None)
+    def test_limits_are_off_by_default(self):
+        with override_settings(MAILING_RATE_LIMITS={}):
+            limiter = get_rate_limiter()
+        self.assertFalse(limiter.limits)
+        self.assertFalse(limiter.blocking)
+
+    @mock.patch("mailing.ratelimit._limiter", None)
+    @override_settings(
+        MAILING_RATE_LIMITS={"global": (10, 20)},
+        MAILING_RATE_LIMIT_REDIS_URL="redis://localhost:6379/1",
+    )
+    def test_configured_limits_are_shared_through_redis(self):
+        self.assertIsInstance(get_rate_limiter(), RedisRateLimiter)
+
+
+@skipUnless(
+    connection.vendor == "postgresql", "EXPLAIN проверяется только на PostgreSQL"
+)
+class QueryPlanTests(TestCase):
+    OWNERS = 50
+    RECIPIENTS = 200
+    MAILINGS = 40
+    ATTEMPTS = 400
+
+    @classmethod
+    def setUpTestData(cls):
+        owners = User.objects.bulk_create(
+            User(email=f"plan{number}@example.com", username=f"plan{number}")
+            for number in range(cls.OWNERS)
+        )
+        now = timezone.now()
+        for owner in owners:
+            recipients = Recipient.objects.bulk_create(
+                Recipient(
+                    email=f"r{number}-{owner.id}@example.com",
+                    email_normalized=f"r{number}-{owner.id}@example.com",
+                    full_name=f"Получатель {number}",
+                    owner=owner,
+                )
+                for number in range(cls.RECIPIENTS)
+            )
+            messages = Message.objects.bulk_create(
+                Message(title=f"Тема {number}", letter="Текст", owner=owner)
+                for number in range(cls.MAILINGS)
+            )
+            mailings = Mailing.objects.bulk_create(
+                Mailing(
+                    first_datetime=now - timedelta(hours=number),
+                    end_datetime=now + timedelta(days=1),
+                    message=message,
+                    owner=owner,
+                )
+                for number, message in enumerate(messages)
+            )
+            MailingAttempt.objects.bulk_create(
+                MailingAttempt(
+                    status="success",
+                    response_code=250,
+                    mailing=mailings[number % cls.MAILINGS],
+                    recipient=recipients[number % cls.RECIPIENTS],
+                    owner=owner,
+                )
+                for number in range(cls.ATTEMPTS)
+            )
+        cls.owner = owners[0]
+        # Без свежей статистики планировщик считает таблицы пустыми
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def test_list_queries_use_indexes(self):
+        for name, queryset in get_querysets(self.owner):
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                self.assertEqual(find_seq_scans(plan), [], plan)
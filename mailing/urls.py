@@ -6,6 +6,7 @@ from .views import (
     RecipientCreateView,
     RecipientUpdateView,
     RecipientDeleteView,
+    RecipientImportView,
     MessageListView,
     MessageDetailView,
     MessageCreateView,
@@ -17,13 +18,16 @@ from .views import (
     MailingUpdateView,
     MailingDeleteView,
     MailingAttemptListView,
-    start_mailing,
+    MailingAttemptExportView,
     StartMailingView,
+    MailingProgressView,
+    MailingStatsView,
     AllMailingsListView,
     AllMessagesListView,
     AllRecipientsListView,
     AllAttemptsListView,
     UserListView,
+    MetricsView,
 )
 from django.contrib.auth.mixins import PermissionRequiredMixin
 
@@ -35,6 +39,7 @@ urlpatterns = [
         "recipients/<int:pk>/", RecipientDetailView.as_view(), name="recipient-detail"
     ),
     path("recipients/create/", RecipientCreateView.as_view(), name="recipient-create"),
+    path("recipients/import/", RecipientImportView.as_view(), name="recipient-import"),
     path(
         "recipients/<int:pk>/update/",
         RecipientUpdateView.as_view(),
@@ -67,8 +72,15 @@ urlpatterns = [
     ),
     # MailingAttempt
     path("attempts/", MailingAttemptListView.as_view(), name="attempt-list"),
-    path("mailings/<int:mailing_id>/start/", start_mailing, name="start-mailing"),
+    path("attempts/export/", MailingAttemptExportView.as_view(), name="attempt-export"),
+    path("mailings/<int:pk>/start/", StartMailingView.as_view(), name="start-mailing"),
     path("mailing/<int:pk>/start/", StartMailingView.as_view(), name="start-mailing"),
+    path(
+        "mailing-runs/<str:job_id>/progress/",
+        MailingProgressView.as_view(),
+        name="mailing-progress",
+    ),
+    path("stats/", MailingStatsView.as_view(), name="mailing-stats"),
     # Moderator URLs
     path(
         "moderator/mailings/", AllMailingsListView.as_view(), name="all-mailings-list"
@@ -85,4 +97,5 @@ urlpatterns = [
         "moderator/attempts/", AllAttemptsListView.as_view(), name="all-attempts-list"
     ),
     path("moderator/users/", UserListView.as_view(), name="user-list"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 ]
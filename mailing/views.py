@@ -1,10 +1,8 @@
 from django.contrib.auth import login
 from django.shortcuts import render, redirect
-from django.core.mail import send_mail
-from django.conf import settings
 from django.contrib import messages
 from django.views import View
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from user.forms import RegisterForm
 from django.views.generic import (
@@ -13,20 +11,31 @@ from django.views.generic import (
     CreateView,
     UpdateView,
     DeleteView,
+    FormView,
 )
-from django.urls import reverse_lazy
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.urls import reverse, reverse_lazy
 
 from user.models import User
-from .models import Recipient, Message, Mailing, MailingAttempt
-import logging
+from .models import Recipient, Message, Mailing, MailingAttempt, MailingStatsHourly
+from .caching import cache_per_user
+from .exports import EXPORT_FORMATS, export_attempts, filter_attempts
+from .forms import RecipientImportForm
+from .imports import import_recipients
+from .metrics import has_metrics_token, registry
+from .pagination import ApproximateCountPaginator, KeysetPaginationMixin
+from .counters import get_counters
+from .progress import get_progress, set_run_total, start_run
+from .services import enqueue_mailing
+from .stats import describe_mailing_stats, get_mailing_stats, get_total_stats
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
 from django.core.cache import cache
 
 
 # Модель 'Получатель'
-@method_decorator(cache_page(60 * 15), name="dispatch")
+@method_decorator(cache_per_user(), name="dispatch")
 class RecipientListView(LoginRequiredMixin, ListView):
     model = Recipient
     template_name = "mailing/recipient_list.html"
@@ -52,9 +61,11 @@ class RecipientCreateView(LoginRequiredMixin, CreateView):
     fields = ["email", "full_name", "comment"]
     success_url = reverse_lazy("recipient-list")
 
-    def form_valid(self, form):
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        # Владелец нужен уже при валидации — для проверки повторного email
         form.instance.owner = self.request.user
-        return super().form_valid(form)
+        return form
 
 
 class RecipientUpdateView(LoginRequiredMixin, UpdateView):
@@ -76,8 +87,27 @@ class RecipientDeleteView(LoginRequiredMixin, DeleteView):
         return super().get_queryset().filter(owner=self.request.user)
 
 
+class RecipientImportView(LoginRequiredMixin, FormView):
+    template_name = "mailing/recipient_import.html"
+    form_class = RecipientImportForm
+
+    def form_valid(self, form):
+        try:
+            report = import_recipients(
+                self.request.user,
+                form.cleaned_data["file"],
+                update_existing=form.cleaned_data["update_existing"],
+            )
+        except ValidationError as error:
+            form.add_error("file", error)
+            return self.form_invalid(form)
+        return self.render_to_response(
+            self.get_context_data(form=self.form_class(), report=report)
+        )
+
+
 # Модель 'Сообщение'
-@method_decorator(cache_page(60 * 15), name="dispatch")
+@method_decorator(cache_per_user(), name="dispatch")
 class MessageListView(LoginRequiredMixin, ListView):
     model = Message
     template_name = "mailing/message_list.html"
@@ -128,7 +158,7 @@ class MessageDeleteView(LoginRequiredMixin, DeleteView):
 
 
 # Модель 'Рассылка'
-@method_decorator(cache_page(60 * 15), name="dispatch")
+@method_decorator(cache_per_user(), name="dispatch")
 class MailingListView(LoginRequiredMixin, ListView):
     model = Mailing
     template_name = "mailing/mailing_list.html"
@@ -238,114 +268,71 @@ class MailingDeleteView(LoginRequiredMixin, DeleteView):
 
 
 # Модель 'Попытка рассылки'
-@method_decorator(cache_page(60 * 15), name="dispatch")
-class MailingAttemptListView(LoginRequiredMixin, ListView):
+@method_decorator(cache_per_user(), name="dispatch")
+class MailingAttemptListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = MailingAttempt
     template_name = "mailing/attempt_list.html"
     context_object_name = "attempts"
     paginate_by = 20
-    ordering = ["-attempt_datetime"]
 
     def get_queryset(self):
-        queryset = super().get_queryset().filter(mailing__owner=self.request.user)
+        # owner у попытки совпадает с владельцем рассылки, фильтр по нему
+        # использует индекс (owner, -attempt_datetime) без JOIN с рассылками
+        queryset = (
+            super()
+            .get_queryset()
+            .filter(owner=self.request.user)
+            .select_related("mailing", "recipient", "response")
+        )
         mailing_id = self.request.GET.get("mailing_id")
         if mailing_id:
             queryset = queryset.filter(mailing_id=mailing_id)
         return queryset
 
 
-def start_mailing(mailing_id):
-    logger = logging.getLogger(__name__)
-
-    try:
-        mailing = Mailing.objects.get(id=mailing_id)
-        recipients = mailing.recipients.all()
-
-        all_successful = True
-        total_recipients = recipients.count()
-        success_count = 0
-        failed_count = 0
-
-        if total_recipients == 0:
-            mailing.status = "completed"
-            mailing.save()
-            return {
-                "total": 0,
-                "success": 0,
-                "failed": 0,
-                "all_successful": True,
-                "status": "completed",
-                "message": "Нет получателей для рассылки",
-            }
-
-        for recipient in recipients:
-            try:
-                send_mail(
-                    subject=mailing.message.title,
-                    message=mailing.message.letter,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[recipient.email],
-                    fail_silently=False,
-                )
+class MailingAttemptExportView(LoginRequiredMixin, View):
+    """Потоковая выгрузка попыток в CSV или NDJSON (?format=ndjson).
 
-                MailingAttempt.objects.create(
-                    status="success",
-                    mailing=mailing,
-                    recipient=recipient,
-                    server_response="Письмо успешно отправлено",
-                    owner=mailing.owner,
-                )
-                success_count += 1
+    Владелец выгружает свои попытки, модератор — все (или одного владельца
+    через ?owner=<id>).
+    """
 
-            except Exception as e:
-                logger.error(f"Ошибка отправки письма для {recipient.email}: {str(e)}")
-
-                MailingAttempt.objects.create(
-                    status="failed",
-                    mailing=mailing,
-                    recipient=recipient,
-                    server_response=str(e),
-                    owner=mailing.owner,
-                )
-                all_successful = False
-                failed_count += 1
-
-        mailing.status = "completed" if all_successful else "started"
-        mailing.save()
-
-        result = {
-            "total": total_recipients,
-            "success": success_count,
-            "failed": failed_count,
-            "all_successful": all_successful,
-            "status": mailing.status,
-            "message": (
-                "Рассылка завершена успешно"
-                if all_successful
-                else "Рассылка завершена с ошибками"
-            ),
-        }
+    def get(self, request):
+        export_format = request.GET.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse(
+                {"status": "error", "message": "Формат должен быть csv или ndjson"},
+                status=400,
+            )
 
-        return result
+        queryset = MailingAttempt.objects.all()
+        if not request.user.has_perm("mailing.view_all_attempts"):
+            queryset = queryset.filter(owner=request.user)
+        elif request.GET.get("owner", "").isdigit():
+            queryset = queryset.filter(owner_id=request.GET["owner"])
+        try:
+            queryset = filter_attempts(queryset, request.GET)
+        except ValidationError as error:
+            return JsonResponse(
+                {"status": "error", "message": "; ".join(error.messages)}, status=400
+            )
 
-    except Mailing.DoesNotExist:
-        logger.error(f"Рассылка с ID {mailing_id} не найдена")
-        return {"status": "error", "message": f"Рассылка с ID {mailing_id} не найдена"}
-    except Exception as e:
-        logger.error(f"Ошибка при выполнении рассылки: {str(e)}")
-        return {"status": "error", "message": f"Произошла ошибка: {str(e)}"}
+        filename = f"attempts-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+        return StreamingHttpResponse(
+            export_attempts(queryset, export_format),
+            content_type=EXPORT_FORMATS[export_format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
 
 
 def home_view(request):
     if request.user.is_authenticated:
+        # Счётчики поддерживаются инкрементально, здесь — одно чтение по ключу
+        counters = get_counters(request.user)
         context = {
-            "total_mailings": Mailing.objects.filter(owner=request.user).count(),
-            "active_mailings": Mailing.objects.filter(
-                owner=request.user, status="started"
-            ).count(),
-            "unique_recipients": Recipient.objects.filter(owner=request.user)
-            .distinct()
-            .count(),
+            "total_mailings": counters.total_mailings,
+            "active_mailings": counters.active_mailings,
+            "unique_recipients": counters.recipients,
         }
     else:
         context = {
@@ -371,8 +358,6 @@ def register_view(request):
 class StartMailingView(LoginRequiredMixin, View):
     def post(self, request, pk):
         try:
-            from .models import Mailing
-
             mailing = Mailing.objects.get(id=pk, owner=request.user)
 
             if mailing.status == "completed":
@@ -380,11 +365,20 @@ class StartMailingView(LoginRequiredMixin, View):
                     {"status": "error", "message": "Рассылка уже завершена"}, status=400
                 )
 
-            # Запускаем рассылку
-            start_mailing(pk)
+            # Ставим рассылку в очередь, отправкой занимается run_mailing_worker.
+            # Запуск регистрируется заранее: воркер может взять первые письма
+            # сразу после фиксации очереди
+            job_id = start_run(mailing)
+            set_run_total(job_id, enqueue_mailing(pk))
 
             return JsonResponse(
-                {"status": "success", "message": "Рассылка успешно запущена"}
+                {
+                    "status": "success",
+                    "message": "Рассылка поставлена в очередь",
+                    "job_id": job_id,
+                    "progress_url": reverse("mailing-progress", args=[job_id]),
+                },
+                status=202,
             )
 
         except Mailing.DoesNotExist:
@@ -395,6 +389,39 @@ class StartMailingView(LoginRequiredMixin, View):
             return JsonResponse({"status": "error", "message": str(e)}, status=500)
 
 
+class MailingProgressView(LoginRequiredMixin, View):
+    def get(self, request, job_id):
+        progress = get_progress(job_id)
+        if progress is None or progress.pop("owner_id") != request.user.id:
+            return JsonResponse(
+                {"status": "error", "message": "Запуск рассылки не найден"}, status=404
+            )
+        return JsonResponse(progress)
+
+
+class MailingStatsView(PermissionRequiredMixin, ListView):
+    permission_required = "mailing.view_mailing_stats"
+    template_name = "mailing/stats.html"
+    context_object_name = "user_stats"
+    paginate_by = 20
+
+    def get_stats_queryset(self):
+        # Статистика читается только из почасовой сводки, без MailingAttempt
+        queryset = MailingStatsHourly.objects.all()
+        if not self.request.user.has_perm("mailing.view_all_mailings"):
+            queryset = queryset.filter(owner=self.request.user)
+        return queryset
+
+    def get_queryset(self):
+        return get_mailing_stats(self.get_stats_queryset())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["user_stats"] = describe_mailing_stats(context["user_stats"])
+        context["total_stats"] = get_total_stats(self.get_stats_queryset())
+        return context
+
+
 # Moderator Views
 class AllMailingsListView(PermissionRequiredMixin, ListView):
     permission_required = "mailing.view_all_mailings"
@@ -402,6 +429,7 @@ class AllMailingsListView(PermissionRequiredMixin, ListView):
     template_name = "mailing/all_mailings_list.html"
     context_object_name = "mailings"
     paginate_by = 20
+    paginator_class = ApproximateCountPaginator
     ordering = ["-first_datetime"]
 
     def get_queryset(self):
@@ -414,6 +442,7 @@ class AllMessagesListView(PermissionRequiredMixin, ListView):
     template_name = "mailing/all_messages_list.html"
     context_object_name = "messages"
     paginate_by = 20
+    paginator_class = ApproximateCountPaginator
     ordering = ["-id"]
 
     def get_queryset(self):
@@ -426,22 +455,26 @@ class AllRecipientsListView(PermissionRequiredMixin, ListView):
     template_name = "mailing/all_recipients_list.html"
     context_object_name = "recipients"
     paginate_by = 20
+    paginator_class = ApproximateCountPaginator
     ordering = ["email"]
 
     def get_queryset(self):
         return super().get_queryset().select_related("owner")
 
 
-class AllAttemptsListView(PermissionRequiredMixin, ListView):
+class AllAttemptsListView(PermissionRequiredMixin, KeysetPaginationMixin, ListView):
     permission_required = "mailing.view_all_attempts"
     model = MailingAttempt
     template_name = "mailing/all_attempts_list.html"
     context_object_name = "attempts"
     paginate_by = 30
-    ordering = ["-attempt_datetime"]
 
     def get_queryset(self):
-        return super().get_queryset().select_related("mailing", "recipient", "owner")
+        return (
+            super()
+            .get_queryset()
+            .select_related("mailing", "recipient", "owner", "response")
+        )
 
 
 class UserListView(PermissionRequiredMixin, ListView):
@@ -450,7 +483,25 @@ class UserListView(PermissionRequiredMixin, ListView):
     template_name = "mailing/user_list.html"
     context_object_name = "users"
     paginate_by = 20
+    paginator_class = ApproximateCountPaginator
     ordering = ["username"]
 
     def get_queryset(self):
         return super().get_queryset().filter(is_active=True)
+
+
+class MetricsView(View):
+    """Метрики запросов в текстовом формате Prometheus.
+
+    Доступны суперпользователю или по токену MAILING_METRICS_TOKEN; показывают
+    только запросы, обработанные этим процессом.
+    """
+
+    def get(self, request):
+        if not getattr(settings, "MAILING_METRICS_ENABLED", False):
+            raise Http404
+        if not (request.user.is_superuser or has_metrics_token(request)):
+            raise PermissionDenied
+        return HttpResponse(
+            registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )